@@ -1,6 +1,7 @@
 import requests
-import pandas as pd
-from database import execute_query
+from snapshot import get_snapshot
+from config import SALES_WINDOW_DAYS
+from forecast import forecast_summary
 
 # --- Ollama Configuration ---
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -35,39 +36,53 @@ def _ollama_request(prompt: str) -> str:
 
 
 # === AI Sales Analysis ===
-def analyze_sales_data():
+def analyze_sales_data(days=SALES_WINDOW_DAYS):
     """
     Uses Ollama to analyze sales performance and generate insights.
     Works with qwen2:1.5b (lightweight model).
+    Only the last `days` of sales are analyzed (None = full history).
     """
     try:
-        sales = execute_query("SELECT * FROM sales")
-        products = execute_query("SELECT * FROM products")
-        customers = execute_query("SELECT * FROM customers")
+        snapshot = get_snapshot()
+        df = snapshot.frame(days, with_products=True)
 
-        if not sales:
+        if df.empty:
             return "No sales data found to analyze."
 
-        df = pd.DataFrame(sales)
-        dfp = pd.DataFrame(products)
+        products = snapshot.products().to_dict("records")
 
-        # Merge product info
-        if "product_id" in df.columns and "id" in dfp.columns:
-            df = df.merge(dfp, left_on="product_id", right_on="id", how="left")
-
-        df["amount"] = pd.to_numeric(df.get("amount", 0), errors="coerce").fillna(0)
         total_sales = df["amount"].sum()
         avg_sale = df["amount"].mean()
         top_product = df["name"].value_counts().idxmax() if "name" in df.columns else "N/A"
 
+        # Forecast figures (exponential smoothing with weekly seasonality)
+        forecast_lines = ""
+        try:
+            fc = forecast_summary()
+        except Exception as e:  # offline: analyse the snapshot without forecasts
+            print(f"[AI] Forecast unavailable: {e}")
+            fc = None
+        if fc:
+            names = {p["id"]: p["name"] for p in products}
+            top = ", ".join(f"{names.get(pid, pid)} ({amt:,.2f})" for pid, amt in fc["top_products"])
+            cats = ", ".join(f"{c} ({amt:,.2f})" for c, amt in fc["categories"].items())
+            forecast_lines = (
+                f"- Forecast next {fc['horizon_days']} days: {fc['forecast_total']:,.2f} "
+                f"(last {fc['horizon_days']} days actual: {fc['last_period_total']:,.2f})\n"
+                f"- 7-day moving average per day: {fc['ma7_daily']:,.2f}\n"
+                f"- Products expected to sell most: {top}\n"
+                f"- Forecast by category: {cats}\n"
+            )
+
         # Build prompt for AI summary
         prompt = (
             f"You are a business analytics assistant.\n"
-            f"Here is the sales summary data:\n"
+            f"Here is the sales summary data ({f'last {days} days' if days else 'all time'}):\n"
             f"- Total Sales: {total_sales}\n"
             f"- Average Sale: {avg_sale}\n"
-            f"- Top Product: {top_product}\n\n"
-            f"Write a short report summarizing sales performance and key opportunities."
+            f"- Top Product: {top_product}\n"
+            f"{forecast_lines}\n"
+            f"Write a short report summarizing sales performance, where sales are heading, and key opportunities."
         )
 
         ai_response = _ollama_request(prompt)
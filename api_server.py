@@ -0,0 +1,324 @@
+import asyncio
+import json
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qs
+from database import pooled_query, sales_source
+from journal import get_journal, validate_amount
+from config import API, SALES_WINDOW_DAYS
+
+# One worker thread per pooled MySQL connection: the event loop never blocks
+# on the driver and never asks the pool for more connections than it has.
+_executor = ThreadPoolExecutor(max_workers=API["pool_size"], thread_name_prefix="api-db")
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 304: "Not Modified", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+async def db(query, params=None, commit=False, replica=False):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, pooled_query, query, params, commit, replica)
+
+
+# === Data version (for ETags and the response cache) ===
+_version = {False: {"seq": None, "at": 0.0}, True: {"seq": None, "at": 0.0}}
+
+
+async def data_version(replica=False):
+    """
+    Latest change_log seq, refreshed at most every version_ttl_ms. Every
+    write bumps it, so (path, version) identifies a response exactly.
+    Routes served from the replica read the replica's own seq, so a lagging
+    replica never caches old data under a newer version.
+    """
+    state = _version[replica]
+    now = time.monotonic()
+    if state["seq"] is None or (now - state["at"]) * 1000 >= API["version_ttl_ms"]:
+        rows = await db("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log", replica=replica)
+        state.update(seq=int(rows[0]["seq"]), at=now)
+    return state["seq"]
+
+
+# === Helpers for query-string parameters ===
+def _int_param(query, name, default=None, minimum=0, maximum=None):
+    raw = query.get(name, [None])[0]
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise HTTPError(400, f"'{name}' must be an integer")
+    if value < minimum:
+        raise HTTPError(400, f"'{name}' must be >= {minimum}")
+    return min(value, maximum) if maximum else value
+
+
+def _page(query):
+    return (_int_param(query, "after_id", 0),
+            _int_param(query, "limit", API["page_size"], 1, API["max_page_size"]))
+
+
+def _days(query):
+    raw = query.get("days", [None])[0]
+    if raw == "all":
+        return None
+    return _int_param(query, "days", SALES_WINDOW_DAYS, 1)
+
+
+def _paged(rows, limit):
+    return {"items": rows, "next_after_id": rows[-1]["id"] if len(rows) == limit else None}
+
+
+# === GET handlers ===
+async def list_products(query):
+    after_id, limit = _page(query)
+    rows = await db("SELECT id, name, category, price FROM products WHERE id > %s ORDER BY id LIMIT %s",
+                    (after_id, limit))
+    return _paged(rows, limit)
+
+
+async def list_customers(query):
+    after_id, limit = _page(query)
+    rows = await db("SELECT id, name, email, phone FROM customers WHERE id > %s ORDER BY id LIMIT %s",
+                    (after_id, limit))
+    return _paged(rows, limit)
+
+
+async def list_sales(query):
+    after_id, limit = _page(query)
+    table, where, params = sales_source(_days(query))
+    where = f"{where} AND id > %s" if where else "WHERE id > %s"
+    rows = await db(f"SELECT id, product_id, customer_id, sale_date, amount FROM {table} "
+                    f"{where} ORDER BY id LIMIT %s", params + (after_id, limit))
+    return _paged(rows, limit)
+
+
+async def get_one(table, columns, row_id):
+    rows = await db(f"SELECT {columns} FROM {table} WHERE id = %s", (row_id,))
+    if not rows:
+        raise HTTPError(404, f"{table[:-1]} {row_id} not found")
+    return rows[0]
+
+
+async def dashboard(query):
+    counts, revenue = await asyncio.gather(
+        db("SELECT (SELECT COUNT(*) FROM products) AS products, "
+           "(SELECT COUNT(*) FROM customers) AS customers, "
+           "(SELECT COUNT(*) FROM sales_all) AS sales", replica=True),
+        db("SELECT COALESCE(SUM(amount), 0) AS total FROM sales_all", replica=True),
+    )
+    return {**counts[0], "total_revenue": revenue[0]["total"]}
+
+
+async def report_summary(query):
+    days = _days(query)
+    table, where, params = sales_source(days)
+    windowed = f"(SELECT * FROM {table} {where})"
+    by_product, by_category, daily = await asyncio.gather(
+        db(f"SELECT p.name AS product, SUM(s.amount) AS amount FROM {windowed} s "
+           f"JOIN products p ON s.product_id = p.id GROUP BY p.name ORDER BY amount DESC", params, replica=True),
+        db(f"SELECT p.category, SUM(s.amount) AS amount FROM {windowed} s "
+           f"JOIN products p ON s.product_id = p.id GROUP BY p.category ORDER BY amount DESC", params, replica=True),
+        db(f"SELECT sale_date, SUM(amount) AS amount FROM {windowed} s "
+           f"GROUP BY sale_date ORDER BY sale_date", params, replica=True),
+    )
+    return {"days": days, "by_product": by_product, "by_category": by_category, "daily": daily}
+
+
+GET_ROUTES = {
+    "/products": list_products,
+    "/customers": list_customers,
+    "/sales": list_sales,
+    "/dashboard": dashboard,
+    "/reports/summary": report_summary,
+}
+# Aggregate-only routes read from the replica (when configured and fresh)
+REPLICA_ROUTES = {"/dashboard", "/reports/summary"}
+ITEM_ROUTES = {
+    "products": "id, name, category, price",
+    "customers": "id, name, email, phone",
+    "sales": "id, product_id, customer_id, sale_date, amount",
+}
+
+
+async def route_get(path, query):
+    if path in GET_ROUTES:
+        return await GET_ROUTES[path](query)
+    parts = path.strip("/").split("/")
+    if len(parts) == 2 and parts[0] in ITEM_ROUTES and parts[1].isdigit():
+        return await get_one(parts[0], ITEM_ROUTES[parts[0]], int(parts[1]))
+    raise HTTPError(404, f"No route for {path}")
+
+
+# === Response cache + request coalescing ===
+# Keyed by (target, data version): entries never go stale, old versions just
+# fall out of the LRU. Concurrent identical GETs share one in-flight query.
+_cache = OrderedDict()
+_inflight = {}
+CACHE_SIZE = 512
+
+
+async def cached_get(target, version):
+    key = (target, version, date.today())
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    if key in _inflight:
+        return await asyncio.shield(_inflight[key])
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        parts = urlsplit(target)
+        body = json.dumps(await route_get(parts.path, parse_qs(parts.query)),
+                          default=_json_default).encode("utf-8")
+        _cache[key] = body
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+        future.set_result(body)
+        return body
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        del _inflight[key]
+
+
+# === Writes ===
+async def post_sale(payload):
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Sale body must be a JSON object")
+    try:
+        product_id = int(payload["product_id"])
+        customer_id = int(payload["customer_id"])
+        amount = validate_amount(payload["amount"])
+        sale_date = date.fromisoformat(payload.get("sale_date") or date.today().isoformat())
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPError(400, f"Invalid sale: {e}")
+    # sales.replay_key is CHAR(36): a longer key would only be rejected later by
+    # the flusher, after the terminal was told the sale was queued.
+    replay_key = payload.get("replay_key")
+    if replay_key is not None and not (isinstance(replay_key, str) and 0 < len(replay_key) <= 36):
+        raise HTTPError(400, "'replay_key' must be a non-empty string of at most 36 characters")
+    loop = asyncio.get_running_loop()
+    key = await loop.run_in_executor(None, get_journal().append, product_id, customer_id,
+                                     sale_date, amount, replay_key)
+    return 202, {"replay_key": key, "status": "queued"}
+
+
+# === Dispatch ===
+async def handle(method, target, headers, body):
+    """Return (status, extra_headers, body_bytes)."""
+    try:
+        if method == "GET":
+            version = await data_version(urlsplit(target).path in REPLICA_ROUTES)
+            etag = f'W/"{version}-{date.today().toordinal()}-{zlib.crc32(target.encode()):x}"'
+            if headers.get("if-none-match") == etag:
+                return 304, {"ETag": etag}, b""
+            return 200, {"ETag": etag, "Cache-Control": "no-cache"}, await cached_get(target, version)
+
+        if method == "POST":
+            payload = json.loads(body or b"null")
+            path = urlsplit(target).path
+            if path == "/sales":
+                status, result = await post_sale(payload)
+            elif path == "/batch":
+                status, result = 200, await handle_batch(payload)
+            else:
+                raise HTTPError(404, f"No route for {path}")
+            return status, {}, json.dumps(result, default=_json_default).encode("utf-8")
+
+        raise HTTPError(405, f"Method {method} not allowed")
+    except HTTPError as e:
+        return e.status, {}, json.dumps({"error": str(e)}).encode("utf-8")
+    except json.JSONDecodeError as e:
+        return 400, {}, json.dumps({"error": f"Invalid JSON: {e}"}).encode("utf-8")
+    except Exception as e:
+        print(f"[api] {method} {target} failed: {e}")
+        return 500, {}, json.dumps({"error": str(e)}).encode("utf-8")
+
+
+async def handle_batch(requests):
+    """
+    POST /batch with [{"method": "GET", "path": "/products/1"}, ...]:
+    runs the sub-requests concurrently and returns their results in order.
+    """
+    if not isinstance(requests, list):
+        raise HTTPError(400, "Batch body must be a JSON list")
+
+    async def one(req):
+        sub_body = json.dumps(req.get("body")).encode("utf-8") if "body" in req else b""
+        status, _, payload = await handle(req.get("method", "GET").upper(), req.get("path", "/"), {}, sub_body)
+        return {"status": status, "body": json.loads(payload) if payload else None}
+
+    return await asyncio.gather(*(one(r) for r in requests))
+
+
+async def serve_client(reader, writer):
+    """Minimal HTTP/1.1 with keep-alive: request line, headers, Content-Length body."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            body = await reader.readexactly(length) if length else b""
+
+            status, extra, payload = await handle(method.upper(), target, headers, body)
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            head += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(host=API["host"], port=API["port"]):
+    server = await asyncio.start_server(serve_client, host, port)
+    print(f"[api] Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_journal().stop()
@@ -0,0 +1,59 @@
+from datetime import date
+from database import get_cursor, execute_query
+from config import ARCHIVE_KEEP_YEARS
+
+
+def archive_cutoff(keep_years=ARCHIVE_KEEP_YEARS):
+    """Sales dated before this day belong to closed years and can be archived."""
+    return date(date.today().year - keep_years, 1, 1)
+
+
+def archive_closed_years(keep_years=ARCHIVE_KEEP_YEARS):
+    """
+    Move sales from closed years into the compressed `sales_archive` table.
+    Each year is copied and deleted in its own transaction so a failure
+    never leaves a year half-moved and lock time stays bounded.
+    Returns a dict of {year: rows_moved}.
+    """
+    cutoff = archive_cutoff(keep_years)
+    years = execute_query(
+        "SELECT DISTINCT YEAR(sale_date) AS y FROM sales WHERE sale_date < %s ORDER BY y",
+        (cutoff,),
+    )
+    moved = {}
+
+    for row in years:
+        year = row["y"]
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        with get_cursor(commit=True) as cursor:
+            # Not a data change for other terminals: keep it out of change_log (see TRIGGERS)
+            cursor.execute("SET @psmms_archiving = 1")
+            # Upsert: an id already archived by an earlier, interrupted run may
+            # have been edited since, and the hot copy is about to be deleted.
+            cursor.execute(
+                "INSERT INTO sales_archive "
+                "(id, product_id, customer_id, sale_date, amount, replay_key, created_at, updated_at) "
+                "SELECT id, product_id, customer_id, sale_date, amount, replay_key, created_at, updated_at "
+                "FROM sales WHERE sale_date >= %s AND sale_date < %s "
+                "ON DUPLICATE KEY UPDATE product_id = VALUES(product_id), customer_id = VALUES(customer_id), "
+                "sale_date = VALUES(sale_date), amount = VALUES(amount), replay_key = VALUES(replay_key), "
+                "created_at = VALUES(created_at), updated_at = VALUES(updated_at), "
+                "archived_at = CURRENT_TIMESTAMP",
+                (start, end),
+            )
+            cursor.execute(
+                "DELETE FROM sales WHERE sale_date >= %s AND sale_date < %s",
+                (start, end),
+            )
+            moved[year] = cursor.rowcount
+            cursor.execute("SET @psmms_archiving = NULL")
+        print(f"[archive] Archived {moved[year]} sales from {year}")
+
+    if not moved:
+        print(f"[archive] Nothing to archive before {cutoff}")
+    return moved
+
+
+# Schedulable entry point, e.g. cron on Jan 2: python archive.py
+if __name__ == "__main__":
+    archive_closed_years()
@@ -0,0 +1,55 @@
+"""
+Compare the dict-row path (execute_query -> DataFrame -> re-typing) with the
+columnar path (fetch_frame) on the sales table.
+
+    python bench_fetch.py [--repeat 3] [--days 365|all]
+
+Prints wall time and peak traced memory (tracemalloc) for each path.
+"""
+import argparse
+import time
+import tracemalloc
+import pandas as pd
+from database import execute_query, fetch_frame, sales_source
+
+
+def dict_path(query, params):
+    df = pd.DataFrame(execute_query(query, params))
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    df["sale_date"] = pd.to_datetime(df["sale_date"], errors="coerce")
+    return df
+
+
+def columnar_path(query, params):
+    return fetch_frame(query, params)
+
+
+def measure(fn, query, params, repeat):
+    best_time, peak = float("inf"), 0
+    rows = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = fn(query, params)
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best_time = min(best_time, elapsed)
+        rows = len(df)
+        del df
+    return rows, best_time, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dict vs columnar fetch")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--days", default="all", help="sales window in days, or 'all'")
+    args = parser.parse_args()
+
+    table, where, params = sales_source(None if args.days == "all" else int(args.days))
+    query = f"SELECT id, product_id, customer_id, sale_date, amount FROM {table} {where}"
+
+    for label, fn in (("dict rows", dict_path), ("columnar", columnar_path)):
+        rows, best, peak = measure(fn, query, params, args.repeat)
+        print(f"[bench] {label:<10} {rows:>10,} rows  best {best * 1000:9.1f} ms  "
+              f"peak {peak / 1024 / 1024:8.1f} MiB")
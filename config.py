@@ -12,6 +12,17 @@ DB_CONFIG = {
 }
 
 
+# Optional read-only replica for reports, exports and AI analysis.
+# Leave as None to send everything to DB_CONFIG; otherwise same keys as DB_CONFIG.
+REPLICA_CONFIG = None
+REPLICA = {
+    "max_lag_seconds": 30,      # beyond this, analytics reads fall back to the primary
+    "lag_check_seconds": 5,     # how often SHOW REPLICA STATUS is checked
+    "retry_after_seconds": 30,  # skip an unreachable/lagging replica for this long
+    "connect_timeout": 3,
+}
+
+
 # Ollama config
 OLLAMA = {
 "host": "http://localhost:11434",
@@ -22,4 +33,62 @@ OLLAMA = {
 
 # Export filenames
 EXPORT_CSV = "sales_data.csv"
-EXPORT_TXT = "sales_data.txt"
\ No newline at end of file
+EXPORT_TXT = "sales_data.txt"
+
+# Incremental export (watermark-based, append-only)
+EXPORT_INCREMENTAL_DIR = "exports"
+EXPORT_WATERMARK_FILE = ".watermarks.json"
+EXPORT_PAGE_ROWS = 10000
+# Only rows whose updated_at is older than this are exported, so rows updated in
+# the same second or by still-open transactions are picked up next run instead of
+# being skipped. Must exceed REPLICA["max_lag_seconds"] plus the longest write transaction.
+EXPORT_SETTLE_SECONDS = 120
+
+
+# Sales history windows / archival
+SALES_WINDOW_DAYS = 365      # default window for Sales, Reports and AI screens (None = all)
+ARCHIVE_KEEP_YEARS = 1       # full years kept hot besides the current one
+
+
+# Multi-terminal change feed
+CHANGE_POLL_MS = 2000            # how often each desktop polls change_log
+CHANGE_LOG_RETENTION_DAYS = 7    # older change_log rows are purged on startup
+
+
+# Write-behind sales journal (local SQLite, drained to MySQL in the background)
+SALES_JOURNAL_PATH = "sales_journal.db"
+JOURNAL_FLUSH_MS = 500
+JOURNAL_BATCH_SIZE = 200
+
+
+# Local HTTP API for POS terminals / dashboards (api_server.py)
+API = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "pool_size": 8,           # MySQL connections (and worker threads) shared by all requests
+    "page_size": 100,
+    "max_page_size": 1000,
+    "version_ttl_ms": 250,    # how long the change_log seq used for ETags is reused
+}
+
+
+# Sales forecasting (forecast.py)
+FORECAST = {
+    "alpha": 0.3,             # level smoothing
+    "gamma": 0.1,             # weekly seasonal smoothing
+    "horizon": 14,            # days shown on the forecast chart
+    "history_days": 365,      # days used for the first fit
+    "refit_days": 14,         # trailing days replayed on every update (late/backdated sales)
+    "cache_path": "forecast_cache.npz",
+}
+
+
+# Rows per chunk for columnar bulk fetches (database.fetch_columns)
+FETCH_CHUNK_ROWS = 50000
+
+
+# Memory-mapped local copy of sales for analytics (snapshot.py)
+SNAPSHOT = {
+    "path": "sales_snapshot.bin",
+    "min_capacity": 65536,    # rows preallocated per column; grows by doubling
+}
@@ -1,7 +1,11 @@
+import threading
+import time
 import mysql.connector
-from mysql.connector import errorcode
+from mysql.connector import errorcode, pooling, FieldType
 from contextlib import contextmanager
-from config import DB_CONFIG
+from datetime import date, timedelta
+from config import (DB_CONFIG, REPLICA_CONFIG, REPLICA, SALES_WINDOW_DAYS, ARCHIVE_KEEP_YEARS, API,
+                    FETCH_CHUNK_ROWS)
 
 # --- SQL table definitions ---
 TABLES = {
@@ -11,7 +15,9 @@ TABLES = {
             name VARCHAR(255) NOT NULL,
             category VARCHAR(255),
             price DECIMAL(10,2) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_products_updated (updated_at, id)
         )
     """,
     "customers": """
@@ -20,7 +26,9 @@ TABLES = {
             name VARCHAR(255) NOT NULL,
             email VARCHAR(255),
             phone VARCHAR(50),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_customers_updated (updated_at, id)
         )
     """,
     "sales": """
@@ -30,13 +38,152 @@ TABLES = {
             customer_id INT NOT NULL,
             sale_date DATE NOT NULL,
             amount DECIMAL(10,2) NOT NULL,
+            replay_key CHAR(36) NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_sales_replay (replay_key),
+            INDEX idx_sales_updated (updated_at, id),
+            INDEX idx_sales_date (sale_date, id),
             FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
             FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
         )
     """,
+    # Cold storage for closed years. InnoDB cannot RANGE-partition a table that
+    # has foreign keys, so `sales` stays the small "hot" table and old years are
+    # moved here by archive.py. No FKs so archived history survives deletes.
+    "sales_archive": """
+        CREATE TABLE IF NOT EXISTS sales_archive (
+            id INT PRIMARY KEY,
+            product_id INT NOT NULL,
+            customer_id INT NOT NULL,
+            sale_date DATE NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            replay_key CHAR(36) NULL,
+            created_at TIMESTAMP NULL,
+            updated_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_sales_archive_date (sale_date, id),
+            INDEX idx_sales_archive_customer (customer_id)
+        ) ROW_FORMAT=COMPRESSED
+    """,
+    # Every insert/update/delete on the live tables gets a sequence number here
+    # (filled by TRIGGERS) so other terminals can poll for deltas since their last seq.
+    "change_log": """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+            table_name VARCHAR(32) NOT NULL,
+            row_id INT NOT NULL,
+            op CHAR(1) NOT NULL,
+            customer_id INT NULL,
+            changed_at TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3),
+            INDEX idx_change_log_time (changed_at)
+        )
+    """,
+    # Per-customer RFM (recency, frequency, monetary) aggregates, maintained by rfm.py
+    "customer_metrics": """
+        CREATE TABLE IF NOT EXISTS customer_metrics (
+            customer_id INT PRIMARY KEY,
+            first_sale DATE,
+            last_sale DATE,
+            frequency INT NOT NULL DEFAULT 0,
+            monetary DECIMAL(14,2) NOT NULL DEFAULT 0,
+            r_score TINYINT,
+            f_score TINYINT,
+            m_score TINYINT,
+            segment VARCHAR(32),
+            INDEX idx_customer_metrics_segment (segment),
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        )
+    """,
+    # Watermarks for incremental jobs (e.g. last sales.id folded into customer_metrics)
+    "metrics_state": """
+        CREATE TABLE IF NOT EXISTS metrics_state (
+            name VARCHAR(64) PRIMARY KEY,
+            value BIGINT NOT NULL
+        )
+    """,
+}
+
+# --- Views (recreated by init_db) ---
+VIEWS = {
+    # Full history across hot and archived sales, for "All time" screens.
+    "sales_all": """
+        CREATE OR REPLACE VIEW sales_all AS
+            SELECT id, product_id, customer_id, sale_date, amount, created_at, updated_at
+            FROM sales
+            UNION ALL
+            SELECT id, product_id, customer_id, sale_date, amount, created_at, updated_at
+            FROM sales_archive
+    """,
 }
 
+# --- Change-log triggers (recreated by init_db) ---
+def _change_log_triggers():
+    triggers = {}
+    for table in ("products", "customers", "sales"):
+        for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+            triggers[f"trg_{table}_{op.lower()}"] = (
+                f"CREATE TRIGGER trg_{table}_{op.lower()} AFTER {event} ON {table} FOR EACH ROW "
+                f"INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {ref}.id, '{op}')"
+            )
+    # Sales entries also record the customer (old and new when a sale is moved
+    # to another customer) so rfm.py recomputes only the customers affected.
+    triggers["trg_sales_i"] = (
+        "CREATE TRIGGER trg_sales_i AFTER INSERT ON sales FOR EACH ROW "
+        "INSERT INTO change_log (table_name, row_id, op, customer_id) "
+        "VALUES ('sales', NEW.id, 'I', NEW.customer_id)"
+    )
+    triggers["trg_sales_u"] = (
+        "CREATE TRIGGER trg_sales_u AFTER UPDATE ON sales FOR EACH ROW "
+        "INSERT INTO change_log (table_name, row_id, op, customer_id) "
+        "SELECT 'sales', NEW.id, 'U', NEW.customer_id "
+        "UNION ALL SELECT 'sales', NEW.id, 'U', OLD.customer_id FROM DUAL WHERE OLD.customer_id <> NEW.customer_id"
+    )
+    # Moving sales to sales_archive is not a data change (sales_all is unchanged),
+    # so archive.py sets @psmms_archiving and those deletes are not logged.
+    triggers["trg_sales_d"] = (
+        "CREATE TRIGGER trg_sales_d AFTER DELETE ON sales FOR EACH ROW "
+        "INSERT INTO change_log (table_name, row_id, op, customer_id) "
+        "SELECT 'sales', OLD.id, 'D', OLD.customer_id FROM DUAL WHERE @psmms_archiving IS NULL"
+    )
+    # FK cascades do not fire triggers, so log the sales they will remove up front.
+    for table, column in (("products", "product_id"), ("customers", "customer_id")):
+        triggers[f"trg_{table}_cascade"] = (
+            f"CREATE TRIGGER trg_{table}_cascade BEFORE DELETE ON {table} FOR EACH ROW "
+            f"INSERT INTO change_log (table_name, row_id, op, customer_id) "
+            f"SELECT 'sales', id, 'D', customer_id FROM sales WHERE {column} = OLD.id"
+        )
+    return triggers
+
+
+TRIGGERS = _change_log_triggers()
+
+# --- Columns added after the first release (migrated in place by init_db) ---
+COLUMN_MIGRATIONS = [
+    ("products", "updated_at",
+     "ALTER TABLE products ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP "
+     "ON UPDATE CURRENT_TIMESTAMP, ADD INDEX idx_products_updated (updated_at, id)"),
+    ("customers", "updated_at",
+     "ALTER TABLE customers ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP "
+     "ON UPDATE CURRENT_TIMESTAMP, ADD INDEX idx_customers_updated (updated_at, id)"),
+    ("sales", "updated_at",
+     "ALTER TABLE sales ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP "
+     "ON UPDATE CURRENT_TIMESTAMP, ADD INDEX idx_sales_updated (updated_at, id)"),
+    ("sales", "replay_key",
+     "ALTER TABLE sales ADD COLUMN replay_key CHAR(36) NULL, ADD UNIQUE KEY uq_sales_replay (replay_key)"),
+    ("sales_archive", "replay_key",
+     "ALTER TABLE sales_archive ADD COLUMN replay_key CHAR(36) NULL AFTER amount"),
+    ("change_log", "customer_id",
+     "ALTER TABLE change_log ADD COLUMN customer_id INT NULL AFTER op"),
+]
+
+# --- Indexes added after the first release (migrated in place by init_db) ---
+INDEX_MIGRATIONS = [
+    ("sales", "idx_sales_date", "CREATE INDEX idx_sales_date ON sales (sale_date, id)"),
+    ("sales_archive", "idx_sales_archive_customer",
+     "CREATE INDEX idx_sales_archive_customer ON sales_archive (customer_id)"),
+]
+
 
 def get_connection():
     """Connect to MySQL; create database if it doesn't exist."""
@@ -59,10 +206,76 @@ def get_connection():
             raise
 
 
+# --- Read replica routing ---
+# Heavy reads (reports, exports, AI analysis) pass replica=True; writes and
+# read-your-writes lookups always use the primary.
+_replica_state = {"checked_at": 0.0, "down_until": 0.0}
+
+
+def _replica_lag(conn):
+    """Seconds behind the source; 0 for a standalone server, None if replication is stopped."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        return 0
+    return row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+
+
+def get_read_connection():
+    """
+    Connection for analytics reads: the replica when one is configured,
+    reachable and no more than REPLICA["max_lag_seconds"] behind (checked at
+    most every lag_check_seconds), otherwise the primary. A failing replica
+    is skipped for retry_after_seconds.
+    """
+    now = time.monotonic()
+    if not REPLICA_CONFIG or now < _replica_state["down_until"]:
+        return get_connection()
+    try:
+        conn = mysql.connector.connect(**_replica_config())
+    except mysql.connector.Error as err:
+        _replica_state["down_until"] = now + REPLICA["retry_after_seconds"]
+        print(f"[database] Replica unavailable, using primary: {err}")
+        return get_connection()
+    if not _replica_fresh(conn, now):
+        conn.close()
+        return get_connection()
+    return conn
+
+
+def _replica_config():
+    # REPLICA_CONFIG may set its own connection_timeout; REPLICA["connect_timeout"] wins
+    return {**REPLICA_CONFIG, "connection_timeout": REPLICA["connect_timeout"]}
+
+
+def _replica_fresh(conn, now):
+    """Lag check (at most every lag_check_seconds); a lagging replica is skipped for retry_after_seconds."""
+    if now - _replica_state["checked_at"] < REPLICA["lag_check_seconds"]:
+        return True
+    try:
+        lag = _replica_lag(conn)
+    except mysql.connector.Error as err:
+        print(f"[database] Cannot read replica status: {err}")
+        lag = None
+    if lag is None or lag > REPLICA["max_lag_seconds"]:
+        _replica_state["down_until"] = now + REPLICA["retry_after_seconds"]
+        print(f"[database] Replica lag {lag}s over limit, using primary")
+        return False
+    _replica_state["checked_at"] = now
+    return True
+
+
 @contextmanager
-def get_cursor(commit=False):
+def get_cursor(commit=False, replica=False):
     """Yield a MySQL cursor; automatically commit/close."""
-    conn = get_connection()
+    conn = get_read_connection() if replica and not commit else get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
         yield cursor
@@ -73,27 +286,67 @@ def get_cursor(commit=False):
         conn.close()
 
 
+def _column_exists(cursor, table, column):
+    """Check information_schema for a column in the configured database."""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _index_exists(cursor, table, index):
+    """Check information_schema for an index in the configured database."""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index),
+    )
+    return cursor.fetchone()[0] > 0
+
+
 def init_db():
     """Initialize all required tables directly (no .sql file)."""
     conn = get_connection()
     cursor = conn.cursor()
     for name, ddl in TABLES.items():
         cursor.execute(ddl)
+    for table, column, ddl in COLUMN_MIGRATIONS:
+        if not _column_exists(cursor, table, column):
+            cursor.execute(ddl)
+            print(f"[database] Added column {table}.{column}")
+    for table, index, ddl in INDEX_MIGRATIONS:
+        if not _index_exists(cursor, table, index):
+            cursor.execute(ddl)
+            print(f"[database] Added index {table}.{index}")
+    for name, ddl in VIEWS.items():
+        cursor.execute(ddl)
+    for name, ddl in TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(ddl)
     conn.commit()
     cursor.close()
     conn.close()
     print("[database] Database and tables initialized successfully.")
 
 
-def execute_query(query, params=None, commit=False):
-    """Run a SQL query safely with automatic cleanup."""
-    with get_cursor(commit=commit) as cursor:
+def execute_query(query, params=None, commit=False, replica=False):
+    """Run a SQL query safely with automatic cleanup (replica=True for heavy reads)."""
+    with get_cursor(commit=commit, replica=replica) as cursor:
         cursor.execute(query, params or ())
         if commit:
             return
         return cursor.fetchall()
 
 
+def execute_insert(query, params=None):
+    """Run an INSERT and return the new row's AUTO_INCREMENT id."""
+    with get_cursor(commit=True) as cursor:
+        cursor.execute(query, params or ())
+        return cursor.lastrowid
+
+
 def fetch_query(query, params=None):
     """Convenience function for SELECT queries."""
     with get_cursor() as cursor:
@@ -101,3 +354,160 @@ def fetch_query(query, params=None):
         return cursor.fetchall()
 
 
+# --- Columnar bulk fetch ---
+# Column kinds for fetch_columns(): how raw MySQL text values become arrays.
+_INT_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24,
+              FieldType.YEAR}
+_FLOAT_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+_DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+
+
+def _column_kind(type_code):
+    if type_code in _INT_TYPES:
+        return "int"
+    if type_code in _FLOAT_TYPES:
+        return "float"
+    if type_code == FieldType.DATE:
+        return "date"
+    if type_code in _DATETIME_TYPES:
+        return "datetime"
+    return "str"
+
+
+def _to_array(values, kind):
+    """Convert one chunk of raw column values (bytes or None) to a typed NumPy array."""
+    import numpy as np
+
+    if kind == "str":
+        return np.array([None if v is None else bytes(v).decode("utf-8") for v in values], dtype=object)
+    null = b"NaT" if kind in ("date", "datetime") else b"nan"
+    raw = np.array([null if v is None else bytes(v) for v in values], dtype="S")
+    if kind in ("int", "cents"):
+        values = raw.astype(np.float64)
+        if kind == "cents":
+            values = np.rint(values * 100)
+        if np.isnan(values).any():
+            return values  # NULLs present: NaN needs a float column
+        return values.astype(np.int64) if kind == "cents" else raw.astype(np.int64)
+    if kind == "float":
+        return raw.astype(np.float64)
+    if kind == "date":
+        return raw.astype("datetime64[D]")
+    return raw.astype("datetime64[s]")
+
+
+def fetch_columns(query, params=None, kinds=None, chunk_size=FETCH_CHUNK_ROWS, replica=False):
+    """
+    Run a SELECT and return {column: numpy array} without building a Python
+    dict (or Decimal/date object) per row. Rows are streamed with a raw
+    cursor in chunks of `chunk_size` and each chunk is converted column-wise.
+
+    Column kinds are inferred from the result metadata (int, float, date,
+    datetime, str); override per column with e.g. kinds={"amount": "cents"}
+    to get exact integer cents instead of float64.
+    """
+    import numpy as np
+
+    kinds = kinds or {}
+    conn = get_read_connection() if replica else get_connection()
+    cursor = conn.cursor(raw=True)
+    try:
+        cursor.execute(query, params or ())
+        names = [d[0] for d in cursor.description]
+        col_kinds = [kinds.get(n) or _column_kind(d[1]) for n, d in zip(names, cursor.description)]
+        chunks = [[] for _ in names]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for i, values in enumerate(zip(*rows)):
+                chunks[i].append(_to_array(values, col_kinds[i]))
+        result = {}
+        for name, kind, parts in zip(names, col_kinds, chunks):
+            if parts:
+                result[name] = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            else:
+                result[name] = _to_array([], kind)
+        return result
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_frame(query, params=None, kinds=None, chunk_size=FETCH_CHUNK_ROWS, replica=False):
+    """fetch_columns() wrapped in a pandas DataFrame with proper dtypes."""
+    import pandas as pd
+
+    return pd.DataFrame(fetch_columns(query, params, kinds, chunk_size, replica))
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(replica=False):
+    """Shared connection pool, created once even when worker threads race on first use."""
+    with _pool_lock:
+        if replica not in _pools:
+            if replica:
+                _pools[replica] = pooling.MySQLConnectionPool(
+                    pool_name="psmms_replica", pool_size=API["pool_size"], **_replica_config())
+            else:
+                _pools[replica] = pooling.MySQLConnectionPool(
+                    pool_name="psmms", pool_size=API["pool_size"], **DB_CONFIG)
+        return _pools[replica]
+
+
+def _pooled_read_connection():
+    """Pooled counterpart of get_read_connection(): the replica pool unless it is down or lagging."""
+    now = time.monotonic()
+    if REPLICA_CONFIG and now >= _replica_state["down_until"]:
+        try:
+            conn = _get_pool(replica=True).get_connection()
+        except mysql.connector.Error as err:
+            _replica_state["down_until"] = now + REPLICA["retry_after_seconds"]
+            print(f"[database] Replica unavailable, using primary: {err}")
+        else:
+            if _replica_fresh(conn, now):
+                return conn
+            conn.close()
+    return _get_pool().get_connection()
+
+
+def pooled_query(query, params=None, commit=False, replica=False):
+    """
+    Like execute_query, but borrows a connection from a shared pool instead
+    of connecting per call. Used by long-running services (api_server.py).
+    """
+    conn = _pooled_read_connection() if replica and not commit else _get_pool().get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params or ())
+        if commit:
+            conn.commit()
+            return cursor.lastrowid
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()  # returns the connection to the pool
+
+
+def sales_window_start(days=SALES_WINDOW_DAYS):
+    """First sale_date inside the default recent window (None means all history)."""
+    if not days:
+        return None
+    return date.today() - timedelta(days=days)
+
+
+def sales_source(days=SALES_WINDOW_DAYS):
+    """
+    Return (table, where_clause, params) for reading sales in a window.
+    Recent windows read only the hot `sales` table (index range scan on
+    sale_date); a window reaching before the archive cut-off, or no window
+    at all, reads the `sales_all` view.
+    """
+    start = sales_window_start(days)
+    if start is None:
+        return "sales_all", "", ()
+    table = "sales" if start.year >= date.today().year - ARCHIVE_KEEP_YEARS else "sales_all"
+    return table, "WHERE sale_date >= %s", (start,)
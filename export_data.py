@@ -1,14 +1,27 @@
+import os
+import json
+from datetime import datetime
 import pandas as pd
 from tkinter import filedialog, messagebox
 from database import execute_query
+from config import EXPORT_INCREMENTAL_DIR, EXPORT_WATERMARK_FILE, EXPORT_PAGE_ROWS, EXPORT_SETTLE_SECONDS
+
+# Tables exported incrementally: the column used for month partitions and the
+# exported columns (explicit, so schema changes never shift the appended CSVs)
+INCREMENTAL_TABLES = {
+    "products": ("created_at", ["id", "name", "category", "price", "created_at", "updated_at"]),
+    "customers": ("created_at", ["id", "name", "email", "phone", "created_at", "updated_at"]),
+    "sales": ("sale_date", ["id", "product_id", "customer_id", "sale_date", "amount", "created_at", "updated_at"]),
+}
+
 
 # === Export to CSV ===
 def export_to_csv():
     try:
-        # Fetch data from database
-        products = execute_query("SELECT * FROM products")
-        customers = execute_query("SELECT * FROM customers")
-        sales = execute_query("SELECT * FROM sales")
+        # Fetch data from database (sales_all: hot + archived years)
+        products = execute_query("SELECT * FROM products", replica=True)
+        customers = execute_query("SELECT * FROM customers", replica=True)
+        sales = execute_query("SELECT * FROM sales_all ORDER BY id", replica=True)
 
         # Convert to DataFrames
         df_products = pd.DataFrame(products)
@@ -41,9 +54,9 @@ def export_to_csv():
 # === Export to TXT ===
 def export_to_txt():
     try:
-        products = execute_query("SELECT * FROM products")
-        customers = execute_query("SELECT * FROM customers")
-        sales = execute_query("SELECT * FROM sales")
+        products = execute_query("SELECT * FROM products", replica=True)
+        customers = execute_query("SELECT * FROM customers", replica=True)
+        sales = execute_query("SELECT * FROM sales_all ORDER BY id", replica=True)
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
@@ -68,3 +81,170 @@ def export_to_txt():
         messagebox.showinfo("Success", f"Data exported successfully to:\n{file_path}")
     except Exception as e:
         messagebox.showerror("Export Error", f"Failed to export TXT: {e}")
+
+
+# === Incremental (watermark-based) export ===
+def _load_watermarks(target_dir):
+    path = os.path.join(target_dir, EXPORT_WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_watermarks(target_dir, marks):
+    # Write to a temp file first so a crash never leaves a half-written watermark
+    path = os.path.join(target_dir, EXPORT_WATERMARK_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(marks, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _export_cutoff():
+    """Whole-second DB time before which updated_at values are considered settled."""
+    rows = execute_query("SELECT NOW() - INTERVAL %s SECOND AS cutoff", (EXPORT_SETTLE_SECONDS,), replica=True)
+    return rows[0]["cutoff"]
+
+
+def _fetch_changed_rows(table, columns, mark, cutoff):
+    """
+    Next page of rows inserted or updated after (updated_at, id) of the last
+    export and before `cutoff`. Rows at or after the cutoff may still gain
+    siblings with the same updated_at (or commit late), so they wait a run.
+    """
+    select = f"SELECT {', '.join(columns)} FROM {table}"
+    if not mark:
+        return execute_query(
+            f"{select} WHERE updated_at < %s ORDER BY updated_at, id LIMIT %s",
+            (cutoff, EXPORT_PAGE_ROWS), replica=True,
+        )
+    return execute_query(
+        f"{select} "
+        f"WHERE (updated_at > %s OR (updated_at = %s AND id > %s)) AND updated_at < %s "
+        f"ORDER BY updated_at, id LIMIT %s",
+        (mark["updated_at"], mark["updated_at"], mark["id"], cutoff, EXPORT_PAGE_ROWS),
+        replica=True,
+    )
+
+
+def _append_csv(df, path):
+    """Append to path; a file whose header differs (older schema) is set aside first."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = f.readline().rstrip("\r\n")
+        if existing != ",".join(df.columns):
+            root, ext = os.path.splitext(path)
+            old = f"{root}.{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+            os.replace(path, old)
+            print(f"[export] Columns changed; previous file kept as {old}")
+    header = not os.path.exists(path)
+    df.to_csv(path, mode="a", header=header, index=False, encoding="utf-8")
+
+
+def _write_page(rows, target_dir, table, month_col, page):
+    df = pd.DataFrame(rows)
+    df["exported_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _append_csv(df, os.path.join(target_dir, f"{table}.csv"))
+    _append_parquet(df, target_dir, table, month_col, page)
+
+
+def _backfill_archive(target_dir, marks):
+    """
+    On the first export into a target, also export closed years that were
+    already moved to sales_archive (the incremental pass only reads hot
+    sales). Paged by id with its own watermark so an interrupted backfill
+    resumes. Returns rows exported.
+    """
+    state = marks.get("sales_archive")
+    if state is None and "sales" not in marks:
+        state = {"id": 0, "done": False}
+    if state is None or state["done"]:
+        return 0
+    month_col, columns = INCREMENTAL_TABLES["sales"]
+    total, page = 0, 0
+    while True:
+        rows = execute_query(
+            f"SELECT {', '.join(columns)} FROM sales_archive WHERE id > %s ORDER BY id LIMIT %s",
+            (state["id"], EXPORT_PAGE_ROWS), replica=True,
+        )
+        if rows:
+            _write_page(rows, target_dir, "sales", month_col, f"archive-{page:05d}")
+            state["id"] = rows[-1]["id"]
+            total += len(rows)
+            page += 1
+        state["done"] = len(rows) < EXPORT_PAGE_ROWS
+        marks["sales_archive"] = state
+        _save_watermarks(target_dir, marks)
+        if state["done"]:
+            return total
+
+
+def _append_parquet(df, target_dir, table, month_col, page=0):
+    """Write one new part file per month partition (Hive-style month=YYYY-MM)."""
+    try:
+        import pyarrow  # noqa: F401  (optional dependency)
+    except ImportError:
+        print("[export] pyarrow not installed; skipping Parquet output.")
+        return
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    months = pd.to_datetime(df[month_col], errors="coerce").dt.strftime("%Y-%m").fillna("unknown")
+    for month, part in df.groupby(months):
+        part_dir = os.path.join(target_dir, "parquet", table, f"month={month}")
+        os.makedirs(part_dir, exist_ok=True)
+        part.to_parquet(os.path.join(part_dir, f"part-{stamp}-{page}.parquet"), index=False)
+
+
+def export_incremental(target_dir=EXPORT_INCREMENTAL_DIR):
+    """
+    Append only rows that are new or changed since the last run to
+    <target_dir>/<table>.csv and <target_dir>/parquet/<table>/month=YYYY-MM/.
+    Rows are read in pages of EXPORT_PAGE_ROWS and the per-target watermark
+    is advanced after each page is written. A new target also receives the
+    already archived sales first. Returns {table: rows_exported}.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    marks = _load_watermarks(target_dir)
+    cutoff = _export_cutoff()
+    counts = {}
+
+    for table, (month_col, columns) in INCREMENTAL_TABLES.items():
+        counts[table] = _backfill_archive(target_dir, marks) if table == "sales" else 0
+        page = 0
+        while True:
+            rows = _fetch_changed_rows(table, columns, marks.get(table), cutoff)
+            if not rows:
+                break
+
+            _write_page(rows, target_dir, table, month_col, f"{page:05d}")
+
+            last = rows[-1]
+            marks[table] = {"id": last["id"], "updated_at": str(last["updated_at"])}
+            _save_watermarks(target_dir, marks)
+            counts[table] += len(rows)
+            page += 1
+            if len(rows) < EXPORT_PAGE_ROWS:
+                break
+
+    print(f"[export] Incremental export to {target_dir}: {counts}")
+    return counts
+
+
+def export_incremental_dialog():
+    try:
+        target_dir = filedialog.askdirectory(title="Choose incremental export folder")
+        if not target_dir:
+            return
+        counts = export_incremental(target_dir)
+        summary = "\n".join(f"{t}: {n} new/changed rows" for t, n in counts.items())
+        messagebox.showinfo("Success", f"Incremental export to:\n{target_dir}\n\n{summary}")
+    except Exception as e:
+        messagebox.showerror("Export Error", f"Failed incremental export: {e}")
+
+
+# Schedulable entry point, e.g. cron: 0 1 * * * python export_data.py exports/accounting
+if __name__ == "__main__":
+    import sys
+    export_incremental(sys.argv[1] if len(sys.argv) > 1 else EXPORT_INCREMENTAL_DIR)
@@ -0,0 +1,223 @@
+import os
+from datetime import date, timedelta
+import numpy as np
+from database import execute_query
+from config import FORECAST
+
+SEASON = 7      # weekly seasonality, indexed by date ordinal % 7
+RECENT = 28     # days kept for the moving averages
+
+
+class ForecastModel:
+    """
+    Additive exponential smoothing with weekly seasonality, run for every
+    series (total, each product, each category) at once: the state is a
+    handful of NumPy arrays with one row per series, so each new day is a
+    few vector operations regardless of how many products there are.
+
+    The state is saved after every update together with a checkpoint taken
+    `refit_days` before `last_day`. Each update replays from that checkpoint,
+    so sales that arrive late for recent days (backdated entries, journal
+    flushes after an outage) are folded in; refreshes cost `refit_days` of
+    daily totals. Sales changes older than the checkpoint, and deleted
+    sales, trigger a full refit (detected through change_log).
+    """
+
+    def __init__(self, path=FORECAST["cache_path"]):
+        self.path = path
+        self.keys = []                          # "total", "product:<id>", "category:<name>"
+        self.index = {}
+        self.level = np.zeros(0)
+        self.season = np.zeros((0, SEASON))
+        self.recent = np.zeros((0, RECENT))
+        self.last_day = None                    # ordinal of the last complete day applied
+        self.ck_day = None                      # ordinal of the checkpoint day
+        self.ck_level, self.ck_season, self.ck_recent = self.level, self.season, self.recent
+        self.change_seq = 0                     # change_log seq the state is current with
+
+    # --- persistence ---
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with np.load(self.path, allow_pickle=False) as data:
+            if "ck_day" not in data.files:
+                return self  # cache without a checkpoint: refit from scratch
+            self.keys = [str(k) for k in data["keys"]]
+            self.level = data["level"]
+            self.season = data["season"]
+            self.recent = data["recent"]
+            self.last_day = int(data["last_day"]) or None
+            self.ck_day = int(data["ck_day"])
+            self.ck_level = data["ck_level"]
+            self.ck_season = data["ck_season"]
+            self.ck_recent = data["ck_recent"]
+            self.change_seq = int(data["change_seq"])
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        return self
+
+    def save(self):
+        np.savez(self.path, keys=np.array(self.keys, dtype=str), level=self.level,
+                 season=self.season, recent=self.recent, last_day=self.last_day or 0,
+                 ck_day=self.ck_day or 0, ck_level=self.ck_level, ck_season=self.ck_season,
+                 ck_recent=self.ck_recent, change_seq=self.change_seq)
+
+    def _reset(self):
+        self.__init__(self.path)
+
+    def _rows_for(self, keys):
+        """Row index for each key, growing the state for series not seen before."""
+        new = [k for k in dict.fromkeys(keys) if k not in self.index]
+        if new:
+            for k in new:
+                self.index[k] = len(self.keys)
+                self.keys.append(k)
+            grow = len(new)
+            self.level = np.concatenate([self.level, np.zeros(grow)])
+            self.season = np.vstack([self.season, np.zeros((grow, SEASON))])
+            self.recent = np.vstack([self.recent, np.zeros((grow, RECENT))])
+            self.ck_level = np.concatenate([self.ck_level, np.zeros(grow)])
+            self.ck_season = np.vstack([self.ck_season, np.zeros((grow, SEASON))])
+            self.ck_recent = np.vstack([self.ck_recent, np.zeros((grow, RECENT))])
+        return np.array([self.index[k] for k in keys], dtype=np.int64)
+
+    # --- updates ---
+    def _fetch_days(self, first_day, end_day):
+        """Daily per-product totals for first_day <= sale_date < end_day."""
+        return execute_query(
+            "SELECT s.product_id, p.category, s.sale_date, SUM(s.amount) AS amount "
+            "FROM sales s JOIN products p ON s.product_id = p.id "
+            "WHERE s.sale_date >= %s AND s.sale_date < %s "
+            "GROUP BY s.product_id, p.category, s.sale_date",
+            (first_day, end_day),
+            replica=True,
+        )
+
+    def _sales_changes(self):
+        """What change_log says about sales since change_seq."""
+        return execute_query(
+            "SELECT (SELECT MIN(seq) FROM change_log) AS oldest, "
+            "(SELECT COALESCE(MAX(seq), 0) FROM change_log) AS latest, "
+            "EXISTS(SELECT 1 FROM change_log WHERE seq > %s AND table_name = 'sales') AS changed, "
+            "EXISTS(SELECT 1 FROM change_log WHERE seq > %s AND table_name = 'sales' AND op = 'D') AS deleted, "
+            "(SELECT MIN(s.sale_date) FROM change_log l JOIN sales s ON s.id = l.row_id "
+            " WHERE l.seq > %s AND l.table_name = 'sales') AS earliest",
+            (self.change_seq,) * 3,
+            replica=True,
+        )[0]
+
+    def _needs_refit(self, changes):
+        """Deleted sales, changes before the checkpoint, or a purged change_log."""
+        if changes["oldest"] is not None and changes["oldest"] > self.change_seq + 1:
+            return True
+        if changes["deleted"]:
+            return True
+        return changes["earliest"] is not None and changes["earliest"].toordinal() <= self.ck_day
+
+    def update(self, today=None):
+        """Apply every complete day up to yesterday, replaying from the checkpoint."""
+        today = today or date.today()
+        changes = self._sales_changes()
+        if self.last_day is not None and self._needs_refit(changes):
+            self._reset()
+        if self.last_day == today.toordinal() - 1 and not changes["changed"]:
+            return self
+        if self.last_day is None:
+            first = today - timedelta(days=FORECAST["history_days"])
+        else:
+            first = date.fromordinal(self.ck_day + 1)
+            self.level, self.season, self.recent = self.ck_level.copy(), self.ck_season.copy(), self.ck_recent.copy()
+        n_days = (today - first).days
+        if n_days <= 0:
+            return self
+
+        rows = self._fetch_days(first, today)
+        # Dense (series x day) matrix, built with one scatter-add per series kind
+        day_idx = np.array([(r["sale_date"] - first).days for r in rows], dtype=np.int64)
+        amounts = np.array([float(r["amount"]) for r in rows])
+        product_rows = self._rows_for([f"product:{r['product_id']}" for r in rows])
+        category_rows = self._rows_for([f"category:{r['category'] or 'Uncategorized'}" for r in rows])
+        total_row = self._rows_for(["total"])[0]
+
+        y = np.zeros((len(self.keys), n_days))
+        np.add.at(y, (product_rows, day_idx), amounts)
+        np.add.at(y, (category_rows, day_idx), amounts)
+        np.add.at(y, (np.full(len(rows), total_row), day_idx), amounts)
+
+        # Advance to the new checkpoint, keep it, then apply the trailing days
+        split = max(n_days - FORECAST["refit_days"], 0)
+        self._apply(y[:, :split], first.toordinal())
+        self.ck_day = first.toordinal() + split - 1
+        self.ck_level, self.ck_season, self.ck_recent = self.level.copy(), self.season.copy(), self.recent.copy()
+        self._apply(y[:, split:], first.toordinal() + split)
+        self.last_day = today.toordinal() - 1
+        self.change_seq = int(changes["latest"])
+        self.save()
+        return self
+
+    def _apply(self, y, first_ordinal):
+        self._smooth(y, first_ordinal)
+        self.recent = np.concatenate([self.recent, y], axis=1)[:, -RECENT:]
+
+    def _smooth(self, y, first_ordinal):
+        alpha, gamma = FORECAST["alpha"], FORECAST["gamma"]
+        for t in range(y.shape[1]):
+            s = (first_ordinal + t) % SEASON
+            obs = y[:, t]
+            prev_season = self.season[:, s]
+            self.level = alpha * (obs - prev_season) + (1 - alpha) * self.level
+            self.season[:, s] = gamma * (obs - self.level) + (1 - gamma) * prev_season
+
+    # --- forecasts ---
+    def forecast(self, horizon=FORECAST["horizon"]):
+        """
+        Return (dates, {"smoothing": array, "ma7": array, "ma28": array}),
+        each array shaped (series, horizon) and aligned with self.keys.
+        """
+        if self.last_day is None:
+            return [], {}
+        ordinals = self.last_day + 1 + np.arange(horizon)
+        smoothing = np.maximum(self.level[:, None] + self.season[:, ordinals % SEASON], 0)
+        ma7 = np.repeat(self.recent[:, -7:].mean(axis=1)[:, None], horizon, axis=1)
+        ma28 = np.repeat(self.recent.mean(axis=1)[:, None], horizon, axis=1)
+        dates = [date.fromordinal(int(o)) for o in ordinals]
+        return dates, {"smoothing": smoothing, "ma7": ma7, "ma28": ma28}
+
+    def history(self, key):
+        """The last RECENT daily actuals for one series, with their dates."""
+        if key not in self.index or self.last_day is None:
+            return [], np.zeros(0)
+        dates = [date.fromordinal(self.last_day - RECENT + 1 + i) for i in range(RECENT)]
+        return dates, self.recent[self.index[key]]
+
+
+_model = None
+
+
+def get_model():
+    """Process-wide model: loaded from the cache once, then brought up to date."""
+    global _model
+    if _model is None:
+        _model = ForecastModel().load()
+    return _model.update()
+
+
+def forecast_summary(horizon=7, top=3):
+    """Plain numbers for reports and the AI prompt."""
+    model = get_model()
+    dates, fc = model.forecast(horizon)
+    if not dates or "total" not in model.index:
+        return None
+    total = model.index["total"]
+    products = [k for k in model.keys if k.startswith("product:")]
+    product_rows = np.array([model.index[k] for k in products], dtype=np.int64)
+    expected = fc["smoothing"][product_rows].sum(axis=1) if products else np.zeros(0)
+    order = np.argsort(expected)[::-1][:top]
+    return {
+        "horizon_days": horizon,
+        "forecast_total": float(fc["smoothing"][total].sum()),
+        "last_period_total": float(model.recent[total, -horizon:].sum()),
+        "ma7_daily": float(fc["ma7"][total, 0]),
+        "top_products": [(int(products[i].split(":", 1)[1]), float(expected[i])) for i in order],
+        "categories": {k.split(":", 1)[1]: float(fc["smoothing"][model.index[k]].sum())
+                       for k in model.keys if k.startswith("category:")},
+    }
@@ -1,3 +1,4 @@
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinter import filedialog
@@ -5,14 +6,40 @@ from tkcalendar import DateEntry
 from datetime import date
 import pandas as pd
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+import matplotlib.dates as mdates
 
 # Project modules
-from database import execute_query, init_db
-from export_data import export_to_csv, export_to_txt
+from database import execute_query, execute_insert, init_db, sales_source
+from config import SALES_WINDOW_DAYS, CHANGE_POLL_MS
+from archive import archive_closed_years, archive_cutoff
+from lookup import get_index, sync_row, sync_delete
+import lookup
+from sync import ChangeFeed, purge_change_log
+from journal import get_journal, validate_amount, MAX_AMOUNT
+from forecast import get_model
+from rfm import refresh_metrics, SEGMENTS
+from timeseries import downsample, max_points_for
+from snapshot import get_snapshot
+from export_data import export_to_csv, export_to_txt, export_incremental_dialog
 from sample_data import insert_sample_data
 from ai_module import analyze_sales_data, chat_with_ai
 
+# Date windows offered on history screens (None = everything incl. archive)
+WINDOW_CHOICES = {
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "Last 365 days": 365,
+    "All history": None,
+}
+
+
+def _window_label(days):
+    for label, value in WINDOW_CHOICES.items():
+        if value == days:
+            return label
+    return f"Last {days} days"
+
 
 class PSMMSApp(tk.Tk):
     def __init__(self):
@@ -51,6 +78,18 @@ class PSMMSApp(tk.Tk):
         self.content = tk.Frame(self.main, bg="#f5f5f5")
         self.content.pack(fill="both", expand=True)
 
+        # Change feed from other terminals; open views register handlers in self._live
+        self._live = {}
+        try:
+            self.feed = ChangeFeed()
+        except Exception as e:
+            self.feed = None
+            print(f"[sync] Change feed disabled: {e}")
+        self.after(CHANGE_POLL_MS, self._poll_changes)
+
+        # Sales are queued locally and written to MySQL by a background flusher
+        self.journal = get_journal()
+
         self.show_home()
 
     # ---------- helpers ----------
@@ -62,12 +101,116 @@ class PSMMSApp(tk.Tk):
         btn.pack(fill="x", pady=3)
 
     def clear_content(self):
+        self._live = {}
         for w in self.content.winfo_children():
             w.destroy()
 
+    def _poll_changes(self):
+        try:
+            if self.feed is not None:
+                changes = self.feed.poll()
+                if changes is None:
+                    # Fell behind the change_log retention: reload everything
+                    lookup.reset()
+                    for handler in list(self._live.values()):
+                        handler(None)
+                else:
+                    for table, ids in changes.items():
+                        if table in ("products", "customers"):
+                            lookup.sync_ids(table, ids)
+                        if table in self._live:
+                            self._live[table](ids)
+        except Exception as e:
+            print(f"[sync] Poll failed: {e}")
+        self._drain_journal()
+        self.after(CHANGE_POLL_MS, self._poll_changes)
+
+    def _drain_journal(self):
+        """Hand flushed/rejected journal entries from the flusher thread to the open view."""
+        done, rejected = [], []
+        while not self.journal.flushed.empty():
+            done.append(self.journal.flushed.get_nowait())
+        while not self.journal.rejected.empty():
+            rejected.append(self.journal.rejected.get_nowait())
+        if "journal" in self._live and (done or rejected):
+            self._live["journal"](done + [(key, None) for key, _ in rejected])
+        if rejected:
+            messagebox.showwarning("Sales Journal", "Some queued sales were rejected by the database:\n\n"
+                                   + "\n".join(err for _, err in rejected)
+                                   + "\n\nThey are kept locally; use Sales > Retry Rejected to send them again.")
+
+    def _make_sortable(self, tree, numeric=()):
+        """Click a heading to sort by it (again to reverse); sorting happens in the widget."""
+        def sort_by(col, reverse):
+            def key(iid):
+                value = tree.set(iid, col)
+                if col in numeric:
+                    try:
+                        return (0, float(value))
+                    except ValueError:
+                        return (1, 0.0)  # blanks (no sales yet) sort last
+                return (0, str(value).lower())
+            items = sorted(tree.get_children(), key=key, reverse=reverse)
+            for pos, iid in enumerate(items):
+                tree.move(iid, "", pos)
+            tree.heading(col, command=lambda: sort_by(col, not reverse))
+
+        for col in tree["columns"]:
+            tree.heading(col, command=lambda c=col: sort_by(c, False))
+
+    def _live_rows(self, refresh, reload_rows):
+        """Handler re-fetching just the changed ids in one query (None = full refresh)."""
+        def handle(ids):
+            if ids is None:
+                return refresh()
+            if ids:
+                reload_rows(list(ids))
+        return handle
+
     def set_title(self, text):
         self.title_label.config(text=text)
 
+    # Row-level tree updates: items use the DB id as iid, so a single write only
+    # touches its own row and selection / scroll position stay where they were.
+    def _tree_upsert(self, tree, row_id, values, index="end"):
+        iid = str(row_id)
+        if tree.exists(iid):
+            tree.item(iid, values=values)
+        else:
+            tree.insert("", index, iid=iid, values=values)
+
+    def _tree_remove(self, tree, row_id):
+        iid = str(row_id)
+        if tree.exists(iid):
+            tree.delete(iid)
+
+    # Autocomplete combobox over the in-memory lookup index (no DB hit per keystroke).
+    # Returns (combo, resolve) where resolve() gives the chosen id or None.
+    def _lookup_combo(self, parent, kind, width):
+        index = get_index(kind)
+        combo = ttk.Combobox(parent, width=width)
+        matches = {}
+
+        def on_key(event):
+            if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+                return
+            found = index.search(combo.get())
+            matches.clear()
+            matches.update((label, row_id) for row_id, label in found)
+            combo["values"] = [label for _, label in found]
+
+        def resolve():
+            text = combo.get().strip()
+            if text in matches:
+                return matches[text]
+            if text.isdigit() and int(text) in index.labels:
+                return int(text)
+            found = index.search(text, limit=2)
+            return found[0][0] if len(found) == 1 else None
+
+        combo.bind("<KeyRelease>", on_key)
+        return combo, resolve
+
     # ---------- Home ----------
     def show_home(self):
         self.clear_content()
@@ -77,8 +220,9 @@ class PSMMSApp(tk.Tk):
         try:
             prod_count = len(execute_query("SELECT id FROM products"))
             cust_count = len(execute_query("SELECT id FROM customers"))
-            sales_count = len(execute_query("SELECT id FROM sales"))
-            total_rev_row = execute_query("SELECT SUM(amount) AS total FROM sales")
+            # All-time figures include archived years (sales_all = hot + archive)
+            sales_count = execute_query("SELECT COUNT(*) AS n FROM sales_all")[0]["n"]
+            total_rev_row = execute_query("SELECT SUM(amount) AS total FROM sales_all")
             total_rev = float(total_rev_row[0].get("total") or 0.0)
         except Exception:
             prod_count = cust_count = sales_count = 0
@@ -97,6 +241,9 @@ class PSMMSApp(tk.Tk):
         card(wrap, "Customers", cust_count)
         card(wrap, "Sales", sales_count)
         card(wrap, "Total Revenue", f"₹{total_rev:,.2f}")
+        pending = self.journal.pending_count()
+        if pending:
+            card(wrap, "Pending Sync", pending)
 
         tk.Label(self.content, text="Use the sidebar to manage data, export, view charts, or chat with AI.",
                  bg="#f5f5f5", fg="#333", font=("Segoe UI", 11)).pack(padx=18, pady=6, anchor="w")
@@ -123,19 +270,34 @@ class PSMMSApp(tk.Tk):
             tree.heading(c, text=c); tree.column(c, width=150, anchor="w")
         tree.pack(fill="both", expand=True, padx=18, pady=10)
 
+        select_sql = "SELECT id, name, category, price FROM products"
+
+        def values(r):
+            return (r["id"], r["name"], r.get("category", ""), r["price"])
+
         def refresh():
             tree.delete(*tree.get_children())
-            rows = execute_query("SELECT id, name, category, price FROM products")
+            rows = execute_query(select_sql)
             for r in rows:
-                tree.insert("", "end", values=(r["id"], r["name"], r.get("category", ""), r["price"]))
+                tree.insert("", "end", iid=str(r["id"]), values=values(r))
+
+        def reload_rows(ids):
+            placeholders = ",".join(["%s"] * len(ids))
+            rows = execute_query(select_sql + f" WHERE id IN ({placeholders})", ids)
+            for r in rows:
+                self._tree_upsert(tree, r["id"], values(r))
+                sync_row("products", r)
+            for row_id in set(ids) - {r["id"] for r in rows}:
+                self._tree_remove(tree, row_id)
+                sync_delete("products", row_id)
 
         def add():
             if not name.get() or not price.get():
                 return messagebox.showerror("Validation", "Name and Price are required.")
-            execute_query("INSERT INTO products (name, category, price) VALUES (%s,%s,%s)",
-                          (name.get(), cat.get(), price.get()), commit=True)
+            new_id = execute_insert("INSERT INTO products (name, category, price) VALUES (%s,%s,%s)",
+                                    (name.get(), cat.get(), price.get()))
             name.delete(0,"end"); cat.delete(0,"end"); price.delete(0,"end")
-            refresh()
+            reload_rows([new_id])
 
         def update():
             sel = tree.selection()
@@ -143,7 +305,7 @@ class PSMMSApp(tk.Tk):
             pid = tree.item(sel[0])["values"][0]
             execute_query("UPDATE products SET name=%s, category=%s, price=%s WHERE id=%s",
                           (name.get(), cat.get(), price.get(), pid), commit=True)
-            refresh()
+            reload_rows([pid])
 
         def delete():
             sel = tree.selection()
@@ -151,13 +313,15 @@ class PSMMSApp(tk.Tk):
             pid = tree.item(sel[0])["values"][0]
             if messagebox.askyesno("Confirm", f"Delete product ID {pid}?"):
                 execute_query("DELETE FROM products WHERE id=%s", (pid,), commit=True)
-                refresh()
+                self._tree_remove(tree, pid)
+                sync_delete("products", pid)
 
         tk.Button(btns, text="Add", command=add, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Update", command=update, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Delete", command=delete, bg="#ff6b6b", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Refresh", command=refresh, bg="#2e8b57", fg="white").pack(side="left", padx=6)
 
+        self._live = {"products": self._live_rows(refresh, reload_rows)}
         refresh()
 
     # ---------- Customers ----------
@@ -176,25 +340,82 @@ class PSMMSApp(tk.Tk):
 
         btns = tk.Frame(self.content, bg="#f5f5f5"); btns.pack(padx=18, pady=6, anchor="w")
 
-        cols = ("ID", "Name", "Email", "Phone")
+        segment = tk.StringVar(value="All segments")
+
+        cols = ("ID", "Name", "Email", "Phone", "Segment", "Last Sale (days)", "Orders", "Spent")
         tree = ttk.Treeview(self.content, columns=cols, show="headings", height=16)
         for c in cols:
-            tree.heading(c, text=c); tree.column(c, width=170, anchor="w")
+            tree.heading(c, text=c); tree.column(c, width=170 if c in ("Name", "Email") else 100, anchor="w")
         tree.pack(fill="both", expand=True, padx=18, pady=10)
+        self._make_sortable(tree, numeric=("ID", "Last Sale (days)", "Orders", "Spent"))
 
-        def refresh():
+        select_sql = """
+            SELECT c.id, c.name, c.email, c.phone, m.segment,
+                   DATEDIFF(CURDATE(), m.last_sale) AS recency, m.frequency, m.monetary
+            FROM customers c
+            LEFT JOIN customer_metrics m ON m.customer_id = c.id
+        """
+
+        def values(r):
+            return (r["id"], r["name"], r.get("email",""), r.get("phone",""), r.get("segment") or "",
+                    "" if r.get("recency") is None else r["recency"], r.get("frequency") or 0,
+                    r.get("monetary") or 0)
+
+        metrics = {"thread": None, "touched": 0}
+
+        def load_rows():
             tree.delete(*tree.get_children())
-            rows = execute_query("SELECT id, name, email, phone FROM customers")
+            if segment.get() in SEGMENTS:
+                rows = execute_query(select_sql + " WHERE m.segment=%s", (segment.get(),))
+            else:
+                rows = execute_query(select_sql)
+            for r in rows:
+                tree.insert("", "end", iid=str(r["id"]), values=values(r))
+
+        def update_metrics():
+            try:
+                # Usually just the customers with changed sales, but can be a full rebuild
+                metrics["touched"] = refresh_metrics()
+            except Exception as e:
+                metrics["touched"] = 0
+                print(f"[rfm] {e}")
+
+        def metrics_done():
+            if not tree.winfo_exists():
+                return
+            if metrics["thread"].is_alive():
+                self.after(200, metrics_done)
+            elif metrics["touched"]:
+                load_rows()
+
+        def refresh():
+            # Show current segments right away; reload once metrics are recomputed off the Tk thread
+            load_rows()
+            if metrics["thread"] is None or not metrics["thread"].is_alive():
+                metrics["thread"] = threading.Thread(target=update_metrics, name="rfm-refresh", daemon=True)
+                metrics["thread"].start()
+                self.after(200, metrics_done)
+
+        def reload_rows(ids):
+            placeholders = ",".join(["%s"] * len(ids))
+            rows = execute_query(select_sql + f" WHERE c.id IN ({placeholders})", ids)
             for r in rows:
-                tree.insert("", "end", values=(r["id"], r["name"], r.get("email",""), r.get("phone","")))
+                if segment.get() in SEGMENTS and r.get("segment") != segment.get():
+                    self._tree_remove(tree, r["id"])
+                else:
+                    self._tree_upsert(tree, r["id"], values(r))
+                sync_row("customers", r)
+            for row_id in set(ids) - {r["id"] for r in rows}:
+                self._tree_remove(tree, row_id)
+                sync_delete("customers", row_id)
 
         def add():
             if not name.get():
                 return messagebox.showerror("Validation", "Name is required.")
-            execute_query("INSERT INTO customers (name, email, phone) VALUES (%s,%s,%s)",
-                          (name.get(), email.get(), phone.get()), commit=True)
+            new_id = execute_insert("INSERT INTO customers (name, email, phone) VALUES (%s,%s,%s)",
+                                    (name.get(), email.get(), phone.get()))
             name.delete(0,"end"); email.delete(0,"end"); phone.delete(0,"end")
-            refresh()
+            reload_rows([new_id])
 
         def update():
             sel = tree.selection()
@@ -202,7 +423,7 @@ class PSMMSApp(tk.Tk):
             cid = tree.item(sel[0])["values"][0]
             execute_query("UPDATE customers SET name=%s, email=%s, phone=%s WHERE id=%s",
                           (name.get(), email.get(), phone.get(), cid), commit=True)
-            refresh()
+            reload_rows([cid])
 
         def delete():
             sel = tree.selection()
@@ -210,13 +431,20 @@ class PSMMSApp(tk.Tk):
             cid = tree.item(sel[0])["values"][0]
             if messagebox.askyesno("Confirm", f"Delete customer ID {cid}?"):
                 execute_query("DELETE FROM customers WHERE id=%s", (cid,), commit=True)
-                refresh()
+                self._tree_remove(tree, cid)
+                sync_delete("customers", cid)
 
         tk.Button(btns, text="Add", command=add, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Update", command=update, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Delete", command=delete, bg="#ff6b6b", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Refresh", command=refresh, bg="#2e8b57", fg="white").pack(side="left", padx=6)
+        tk.Label(btns, text="Segment:", bg="#f5f5f5").pack(side="left", padx=(18, 4))
+        seg_box = ttk.Combobox(btns, textvariable=segment, values=["All segments"] + SEGMENTS,
+                               state="readonly", width=16)
+        seg_box.pack(side="left")
+        seg_box.bind("<<ComboboxSelected>>", lambda e: refresh())
 
+        self._live = {"customers": self._live_rows(refresh, reload_rows)}
         refresh()
 
     # ---------- Sales (with Date) ----------
@@ -225,13 +453,13 @@ class PSMMSApp(tk.Tk):
         self.set_title("💰 Manage Sales")
 
         form = tk.Frame(self.content, bg="#f5f5f5"); form.pack(padx=18, pady=(10, 6), anchor="w")
-        tk.Label(form, text="Product ID:", bg="#f5f5f5").grid(row=0, column=0, padx=6, pady=4, sticky="e")
-        tk.Label(form, text="Customer ID:", bg="#f5f5f5").grid(row=0, column=2, padx=6, pady=4, sticky="e")
+        tk.Label(form, text="Product:", bg="#f5f5f5").grid(row=0, column=0, padx=6, pady=4, sticky="e")
+        tk.Label(form, text="Customer:", bg="#f5f5f5").grid(row=0, column=2, padx=6, pady=4, sticky="e")
         tk.Label(form, text="Amount:", bg="#f5f5f5").grid(row=0, column=4, padx=6, pady=4, sticky="e")
         tk.Label(form, text="Sale Date:", bg="#f5f5f5").grid(row=0, column=6, padx=6, pady=4, sticky="e")
 
-        pid = tk.Entry(form, width=10); pid.grid(row=0, column=1, padx=6)
-        cid = tk.Entry(form, width=10); cid.grid(row=0, column=3, padx=6)
+        pid, product_id = self._lookup_combo(form, "products", 24); pid.grid(row=0, column=1, padx=6)
+        cid, customer_id = self._lookup_combo(form, "customers", 24); cid.grid(row=0, column=3, padx=6)
         amt = tk.Entry(form, width=12); amt.grid(row=0, column=5, padx=6)
         sdate = DateEntry(form, width=12, background="darkblue", foreground="white",
                           borderwidth=2, year=date.today().year, month=date.today().month,
@@ -240,44 +468,142 @@ class PSMMSApp(tk.Tk):
 
         btns = tk.Frame(self.content, bg="#f5f5f5"); btns.pack(padx=18, pady=6, anchor="w")
 
+        window = tk.StringVar(value=_window_label(SALES_WINDOW_DAYS))
+
         cols = ("ID", "Product", "Customer", "Date", "Amount")
         tree = ttk.Treeview(self.content, columns=cols, show="headings", height=16)
         for c in cols:
             tree.heading(c, text=c); tree.column(c, width=160 if c!="Amount" else 120, anchor="w")
         tree.pack(fill="both", expand=True, padx=18, pady=10)
+        tree.tag_configure("pending", foreground="#888888")
+
+        select_sql = """
+            SELECT s.id, s.product_id, s.customer_id, p.name AS product, c.name AS customer,
+                   s.sale_date, s.amount
+            FROM (SELECT * FROM {table} {where}) s
+            JOIN products p ON s.product_id = p.id
+            JOIN customers c ON s.customer_id = c.id
+        """
+
+        # sale iid -> (product_id, customer_id), so a product/customer rename only
+        # touches the rows that show it
+        refs = {}
+
+        def values(r):
+            refs[str(r["id"])] = (r["product_id"], r["customer_id"])
+            return (r["id"], r["product"], r["customer"], str(r["sale_date"]), r["amount"])
 
         def refresh():
-            tree.delete(*tree.get_children())
-            rows = execute_query("""
-                SELECT s.id, p.name AS product, c.name AS customer, s.sale_date, s.amount
-                FROM sales s
-                JOIN products p ON s.product_id = p.id
-                JOIN customers c ON s.customer_id = c.id
-                ORDER BY s.sale_date DESC, s.id DESC
-            """)
+            # Keep rows still waiting in the journal; the flusher swaps them in later
+            tree.delete(*[i for i in tree.get_children() if not i.startswith("pending-")])
+            refs.clear()
+            table, where, params = sales_source(WINDOW_CHOICES.get(window.get(), SALES_WINDOW_DAYS))
+            rows = execute_query(select_sql.format(table=table, where=where)
+                                 + " ORDER BY s.sale_date DESC, s.id DESC", params)
+            for r in rows:
+                tree.insert("", "end", iid=str(r["id"]), values=values(r))
+
+        def sort_id(value):
+            # Queued sales have no id yet; they sort as newest within their date
+            return int(value) if str(value).isdigit() else float("inf")
+
+        def insert_index(sale_date, sale_id):
+            # Binary search for the slot keeping (sale_date DESC, id DESC) order
+            children = tree.get_children()
+            key = (str(sale_date), sort_id(sale_id))
+            lo, hi = 0, len(children)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                other = (tree.set(children[mid], "Date"), sort_id(tree.set(children[mid], "ID")))
+                if other > key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+
+        def reload_rows(ids):
+            table, where, params = sales_source(WINDOW_CHOICES.get(window.get(), SALES_WINDOW_DAYS))
+            placeholders = ",".join(["%s"] * len(ids))
+            rows = execute_query(select_sql.format(table=table, where=where)
+                                 + f" WHERE s.id IN ({placeholders})", params + tuple(ids))
             for r in rows:
-                tree.insert("", "end", values=(r["id"], r["product"], r["customer"], str(r["sale_date"]), r["amount"]))
+                self._tree_upsert(tree, r["id"], values(r), insert_index(r["sale_date"], r["id"]))
+            for row_id in set(ids) - {r["id"] for r in rows}:
+                self._tree_remove(tree, row_id)
+                refs.pop(str(row_id), None)
+
+        def rename(table, column, pos, ids):
+            """Patch the Product/Customer column of rows referencing changed ids."""
+            if ids is None:
+                return refresh()
+            shown = set(ids) & {ref[pos] for ref in refs.values()}
+            if not shown:
+                return  # e.g. a new customer: nothing on screen references it
+            placeholders = ",".join(["%s"] * len(shown))
+            names = {r["id"]: r["name"] for r in
+                     execute_query(f"SELECT id, name FROM {table} WHERE id IN ({placeholders})", list(shown))}
+            for iid, ref in refs.items():
+                # Deleted products/customers cascade to sales, which arrive as sales changes
+                if ref[pos] in names and tree.exists(iid):
+                    tree.set(iid, column, names[ref[pos]])
 
         def add():
             if not (pid.get() and cid.get() and amt.get()):
-                return messagebox.showerror("Validation", "Product ID, Customer ID, and Amount are required.")
-            execute_query("INSERT INTO sales (product_id, customer_id, sale_date, amount) VALUES (%s,%s,%s,%s)",
-                          (pid.get(), cid.get(), sdate.get(), amt.get()), commit=True)
+                return messagebox.showerror("Validation", "Product, Customer, and Amount are required.")
+            p_id, c_id = product_id(), customer_id()
+            if p_id is None or c_id is None:
+                return messagebox.showerror("Validation", "Pick a product and a customer from the suggestions.")
+            try:
+                amount = validate_amount(amt.get().strip())
+            except ValueError:
+                return messagebox.showerror("Validation", f"Amount must be a number from 0 to {MAX_AMOUNT}.")
+            key = self.journal.append(p_id, c_id, sdate.get(), amount)
+            tree.insert("", insert_index(sdate.get(), "pending"), iid=f"pending-{key}", tags=("pending",),
+                        values=("⏳", get_index("products").labels.get(p_id, p_id),
+                                get_index("customers").labels.get(c_id, c_id), sdate.get(), amount))
             pid.delete(0,"end"); cid.delete(0,"end"); amt.delete(0,"end")
-            refresh()
+
+        def journal_done(entries):
+            # Swap queued rows for the real ones once the flusher has written them
+            for key, _ in entries:
+                if tree.exists(f"pending-{key}"):
+                    tree.delete(f"pending-{key}")
+            saved = [sale_id for _, sale_id in entries if sale_id is not None]
+            if saved:
+                reload_rows(saved)
 
         def delete():
             sel = tree.selection()
             if not sel: return
+            if sel[0].startswith("pending-"):
+                return messagebox.showinfo("Sales", "This sale is still being saved; try again in a moment.")
             sid = tree.item(sel[0])["values"][0]
             if messagebox.askyesno("Confirm", f"Delete sale ID {sid}?"):
                 execute_query("DELETE FROM sales WHERE id=%s", (sid,), commit=True)
-                refresh()
+                self._tree_remove(tree, sid)
+                refs.pop(str(sid), None)
+
+        def retry_rejected():
+            # Rejected sales stay in the local journal until requeued here
+            count = self.journal.requeue_rejected()
+            messagebox.showinfo("Sales Journal", f"Requeued {count} rejected sale(s)." if count
+                                else "There are no rejected sales.")
 
         tk.Button(btns, text="Add", command=add, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Delete", command=delete, bg="#ff6b6b", fg="white").pack(side="left", padx=6)
         tk.Button(btns, text="Refresh", command=refresh, bg="#2e8b57", fg="white").pack(side="left", padx=6)
-
+        tk.Button(btns, text="Retry Rejected", command=retry_rejected, bg="#3b3b5c", fg="white").pack(side="left", padx=6)
+        tk.Label(btns, text="Show:", bg="#f5f5f5").pack(side="left", padx=(18, 4))
+        win_box = ttk.Combobox(btns, textvariable=window, values=list(WINDOW_CHOICES), state="readonly", width=14)
+        win_box.pack(side="left")
+        win_box.bind("<<ComboboxSelected>>", lambda e: refresh())
+
+        self._live = {
+            "sales": self._live_rows(refresh, reload_rows),
+            "products": lambda ids: rename("products", "Product", 0, ids),
+            "customers": lambda ids: rename("customers", "Customer", 1, ids),
+            "journal": journal_done,
+        }
         refresh()
 
     # ---------- Import / Export ----------
@@ -293,19 +619,47 @@ class PSMMSApp(tk.Tk):
         tk.Button(self.content, text="Export to TXT", command=export_to_txt,
                   bg="#3b3b5c", fg="white", padx=12).pack(padx=18, pady=8, anchor="w")
 
+        tk.Label(self.content, text="Append only new or changed rows since the last export to a folder (CSV + Parquet).",
+                 bg="#f5f5f5", fg="#333", font=("Segoe UI", 11)).pack(padx=18, pady=(14, 2), anchor="w")
+        tk.Button(self.content, text="Incremental Export", command=export_incremental_dialog,
+                  bg="#2e8b57", fg="white", padx=12).pack(padx=18, pady=8, anchor="w")
+
+        def archive():
+            cutoff = archive_cutoff()
+            if not messagebox.askyesno("Archive", f"Move all sales dated before {cutoff} to the archive table?"):
+                return
+            try:
+                moved = archive_closed_years()
+                summary = "\n".join(f"{y}: {n} sales" for y, n in moved.items()) or "Nothing to archive."
+                messagebox.showinfo("Archive", summary)
+            except Exception as e:
+                messagebox.showerror("Archive Error", f"Failed to archive sales: {e}")
+
+        tk.Label(self.content, text="Move sales from closed years into the compressed archive table.",
+                 bg="#f5f5f5", fg="#333", font=("Segoe UI", 11)).pack(padx=18, pady=(14, 2), anchor="w")
+        tk.Button(self.content, text="Archive Closed Years", command=archive,
+                  bg="#3b3b5c", fg="white", padx=12).pack(padx=18, pady=8, anchor="w")
+
            # ---------- Reports / Charts ----------
-    def show_reports(self):
+    def show_reports(self, days=SALES_WINDOW_DAYS):
         self.clear_content()
         self.set_title("📊 Sales Charts & Reports")
 
+        bar = tk.Frame(self.content, bg="#f5f5f5"); bar.pack(padx=20, pady=(6, 0), anchor="w")
+        tk.Label(bar, text="Period:", bg="#f5f5f5").pack(side="left", padx=(0, 4))
+        window = tk.StringVar(value=_window_label(days))
+        win_box = ttk.Combobox(bar, textvariable=window, values=list(WINDOW_CHOICES), state="readonly", width=14)
+        win_box.pack(side="left")
+        win_box.bind("<<ComboboxSelected>>", lambda e: self.show_reports(WINDOW_CHOICES[window.get()]))
+
         import matplotlib.pyplot as plt
         from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         import pandas as pd
 
-        # --- Fetch data from DB ---
+        # --- Load from the local snapshot (topped up from DB, usable offline) ---
         try:
-            sales = execute_query("SELECT * FROM sales")
-            products = execute_query("SELECT * FROM products")
+            snapshot = get_snapshot()
+            df = snapshot.frame(days, with_products=True)
         except Exception as e:
             tk.Label(
                 self.content,
@@ -316,7 +670,7 @@ class PSMMSApp(tk.Tk):
             ).pack(pady=20)
             return
 
-        if not sales or not products:
+        if df.empty or df["name"].isna().all():
             tk.Label(
                 self.content,
                 text="No sales or products found.\nPlease add some data or use 'Load Sample Data'.",
@@ -326,17 +680,6 @@ class PSMMSApp(tk.Tk):
             ).pack(pady=20)
             return
 
-        # --- Prepare data ---
-        df_sales = pd.DataFrame(sales)
-        df_products = pd.DataFrame(products)
-
-        # Merge for product/category names
-        df = df_sales.merge(df_products, left_on="product_id", right_on="id", how="left")
-
-        # Convert types
-        df["amount"] = pd.to_numeric(df.get("amount", 0), errors="coerce").fillna(0)
-        df["sale_date"] = pd.to_datetime(df.get("sale_date"), errors="coerce")
-
         # Scrollable wrapper
         wrapper = tk.Frame(self.content, bg="#f5f5f5")
         wrapper.pack(fill="both", expand=True, padx=20, pady=10)
@@ -373,20 +716,93 @@ class PSMMSApp(tk.Tk):
                 canvas2.get_tk_widget().pack(pady=10)
 
         # 3️⃣ --- Sales Trend (by Date) ---
+        # Bucketed to day/week/month and LTTB-thinned to the chart's pixel width;
+        # the date range and toolbar zoom re-aggregate only the visible window.
         if "sale_date" in df.columns:
             daily_sales = df.groupby("sale_date")["amount"].sum().sort_index()
             if not daily_sales.empty:
+                trend = tk.Frame(wrapper, bg="#f5f5f5"); trend.pack(pady=10)
+                ctrl = tk.Frame(trend, bg="#f5f5f5"); ctrl.pack(anchor="w")
+                first, last = daily_sales.index.min().date(), daily_sales.index.max().date()
+                tk.Label(ctrl, text="From:", bg="#f5f5f5").pack(side="left", padx=(0, 4))
+                from_date = DateEntry(ctrl, width=11, date_pattern="yyyy-mm-dd")
+                from_date.set_date(first); from_date.pack(side="left")
+                tk.Label(ctrl, text="To:", bg="#f5f5f5").pack(side="left", padx=(8, 4))
+                to_date = DateEntry(ctrl, width=11, date_pattern="yyyy-mm-dd")
+                to_date.set_date(last); to_date.pack(side="left")
+
                 fig3, ax3 = plt.subplots(figsize=(6, 4))
-                daily_sales.plot(kind="line", marker="o", color="#FF9800", ax=ax3)
-                ax3.set_title("Sales Trend Over Time", fontsize=12)
-                ax3.set_ylabel("Amount")
-                ax3.set_xlabel("Date")
-                fig3.autofmt_xdate()
-                plt.tight_layout()
+                canvas3 = FigureCanvasTkAgg(fig3, master=trend)
+                toolbar = NavigationToolbar2Tk(canvas3, trend, pack_toolbar=False)
+                toolbar.update()
+                state = {"drawing": False, "pending": None}
+
+                def draw_trend(series):
+                    state["drawing"] = True
+                    ax3.clear()
+                    points, label = downsample(series, max_points_for(fig3, ax3))
+                    ax3.plot(points.index, points.values, color="#FF9800",
+                             marker="o" if len(points) <= 60 else None)
+                    ax3.set_title(f"Sales Trend Over Time ({label})", fontsize=12)
+                    ax3.set_ylabel("Amount")
+                    ax3.set_xlabel("Date")
+                    fig3.autofmt_xdate()
+                    fig3.tight_layout()
+                    canvas3.draw_idle()
+                    ax3.callbacks.connect("xlim_changed", on_zoom)  # clear() drops callbacks
+                    state["drawing"] = False
+
+                def load_range(start, end):
+                    try:
+                        draw_trend(snapshot.daily_totals(start, end))
+                    except Exception as e:
+                        messagebox.showerror("Charts", f"Failed to load sales trend: {e}")
+
+                def on_zoom(axes):
+                    if state["drawing"]:
+                        return
+                    if state["pending"]:
+                        self.after_cancel(state["pending"])
+                    lo, hi = (mdates.num2date(x).date() for x in axes.get_xlim())
+                    state["pending"] = self.after(400, lambda: (from_date.set_date(lo), to_date.set_date(hi),
+                                                                load_range(lo, hi)))
+
+                tk.Button(ctrl, text="Apply", bg="#3b3b5c", fg="white",
+                          command=lambda: load_range(from_date.get_date(), to_date.get_date())
+                          ).pack(side="left", padx=8)
+                tk.Button(ctrl, text="Reset", bg="#2e8b57", fg="white",
+                          command=lambda: (from_date.set_date(first), to_date.set_date(last),
+                                           draw_trend(daily_sales))).pack(side="left")
+
+                canvas3.get_tk_widget().pack()
+                toolbar.pack(anchor="w")
+                draw_trend(daily_sales)
+
+        # 4️⃣ --- Sales Forecast (next days) ---
+        try:
+            model = get_model()
+            fc_dates, fc = model.forecast()
+            hist_dates, hist = model.history("total")
+        except Exception as e:
+            fc_dates = []
+            print(f"[forecast] {e}")
+        if fc_dates and "total" in model.index:
+            total_row = model.index["total"]
+            fig4, ax4 = plt.subplots(figsize=(6, 4))
+            ax4.plot(hist_dates, hist, color="#FF9800", label="Actual")
+            ax4.plot(fc_dates, fc["smoothing"][total_row], color="#7B1FA2", linestyle="--", marker="o",
+                     label="Forecast (seasonal smoothing)")
+            ax4.plot(fc_dates, fc["ma7"][total_row], color="#888888", linestyle=":", label="7-day average")
+            ax4.set_title(f"Sales Forecast (next {len(fc_dates)} days)", fontsize=12)
+            ax4.set_ylabel("Amount")
+            ax4.set_xlabel("Date")
+            ax4.legend(fontsize=8)
+            fig4.autofmt_xdate()
+            plt.tight_layout()
 
-                canvas3 = FigureCanvasTkAgg(fig3, master=wrapper)
-                canvas3.draw()
-                canvas3.get_tk_widget().pack(pady=10)
+            canvas4 = FigureCanvasTkAgg(fig4, master=wrapper)
+            canvas4.draw()
+            canvas4.get_tk_widget().pack(pady=10)
 
         # --- Summary Label ---
         total_sales = df["amount"].sum()
@@ -529,11 +945,13 @@ def draw_charts(csv_path):
         if "sale_date" not in df.columns or "amount" not in df.columns:
             messagebox.showwarning("Charts", "CSV must include 'sale_date' and 'amount' columns.")
             return
-        df["sale_date"] = pd.to_datetime(df["sale_date"], errors="coerce")
+        # Exports may carry full timestamps; bucket by calendar day
+        df["sale_date"] = pd.to_datetime(df["sale_date"], errors="coerce").dt.normalize()
+        df = df.dropna(subset=["sale_date"])
         df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0)
 
-        # Daily totals
-        daily = df.groupby(df["sale_date"].dt.date)["amount"].sum()
+        # Daily totals, bucketed/downsampled so long histories stay readable
+        daily, resolution = downsample(df.groupby("sale_date")["amount"].sum(), 120)
 
         # Top 5 products (if product/name exists)
         if "product" in df.columns:
@@ -545,7 +963,7 @@ def draw_charts(csv_path):
 
         # Plot daily bar
         fig1, ax1 = plt.subplots(figsize=(8, 3.6))
-        daily.plot(kind="bar", ax=ax1, title="Daily Sales")
+        daily.plot(kind="bar" if len(daily) <= 60 else "line", ax=ax1, title=f"{resolution} Sales")
         plt.tight_layout()
         app._plot_embed(fig1)
 
@@ -562,6 +980,8 @@ def draw_charts(csv_path):
 
 if __name__ == "__main__":
     init_db()
+    purge_change_log()
     app = PSMMSApp()
     app.mainloop()
+    app.journal.stop()
 
@@ -0,0 +1,243 @@
+import queue
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import mysql.connector
+from mysql.connector import errorcode
+from database import get_cursor
+from config import SALES_JOURNAL_PATH, JOURNAL_FLUSH_MS, JOURNAL_BATCH_SIZE
+
+# Largest value sales.amount (DECIMAL(10,2)) can hold
+MAX_AMOUNT = Decimal("99999999.99")
+
+# Errors raised by the INSERT itself that mean "this row will never insert".
+# Anything else (connection refused, access denied, unknown database/table)
+# happens before any row is sent and is retried with backoff instead.
+_REJECT_ERRORS = (
+    mysql.connector.errors.IntegrityError,
+    mysql.connector.errors.DataError,
+)
+# Strict-mode value errors that the driver reports with a generic SQLSTATE
+_REJECT_ERRNOS = {
+    errorcode.ER_TRUNCATED_WRONG_VALUE,
+    errorcode.ER_TRUNCATED_WRONG_VALUE_FOR_FIELD,
+    errorcode.ER_WARN_DATA_OUT_OF_RANGE,
+    errorcode.ER_BAD_NULL_ERROR,
+    errorcode.ER_DATA_TOO_LONG,
+    errorcode.ER_NO_REFERENCED_ROW_2,
+}
+
+
+def _is_row_error(err):
+    return isinstance(err, _REJECT_ERRORS) or getattr(err, "errno", None) in _REJECT_ERRNOS
+
+
+def validate_amount(amount):
+    """Return amount as a 2-place Decimal, or raise ValueError if sales.amount cannot hold it."""
+    try:
+        value = Decimal(str(amount)).quantize(Decimal("0.01"), ROUND_HALF_UP)  # as MySQL rounds
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"invalid amount {amount!r}")
+    if not value.is_finite() or value < 0 or value > MAX_AMOUNT:
+        raise ValueError(f"amount must be between 0 and {MAX_AMOUNT}")
+    return value
+
+
+class SalesJournal:
+    """
+    Local append-only journal for sales (SQLite, WAL, synchronous=FULL).
+    append() is a single local fsync'd insert, so checkout never waits on
+    MySQL. A background thread drains pending rows to the `sales` table in
+    batched transactions; each row carries a replay_key (UNIQUE in MySQL)
+    so replays after a crash or timeout never create duplicates.
+    """
+
+    def __init__(self, path=SALES_JOURNAL_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pending_sales (
+                replay_key TEXT PRIMARY KEY,
+                product_id INTEGER NOT NULL,
+                customer_id INTEGER NOT NULL,
+                sale_date TEXT NOT NULL,
+                amount TEXT NOT NULL,
+                queued_at TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self.flushed = queue.Queue()   # (replay_key, sale_id) for the GUI thread
+        self.rejected = queue.Queue()  # (replay_key, error) for the GUI thread
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()  # one drain at a time (flusher thread vs stop())
+        self._wake = threading.Event()
+        self._thread = None
+
+    # --- producer side (GUI thread) ---
+    def append(self, product_id, customer_id, sale_date, amount, replay_key=None):
+        """
+        Durably queue a sale and return its replay key. Callers that retry
+        (e.g. POS terminals) can pass their own key; a repeat is a no-op.
+        """
+        key = replay_key or str(uuid.uuid4())
+        amount = validate_amount(amount)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO pending_sales "
+                "(replay_key, product_id, customer_id, sale_date, amount, queued_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (key, int(product_id), int(customer_id), str(sale_date), str(amount),
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+        self._wake.set()
+        return key
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM pending_sales WHERE status='pending'").fetchone()[0]
+
+    def rejected_count(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM pending_sales WHERE status='rejected'").fetchone()[0]
+
+    def requeue_rejected(self):
+        """Put rejected sales back in the queue (e.g. after fixing the product/customer); returns count."""
+        with self._lock:
+            count = self._db.execute(
+                "UPDATE pending_sales SET status='pending' WHERE status='rejected'").rowcount
+        if count:
+            self._wake.set()
+        return count
+
+    # --- consumer side (flusher thread) ---
+    def _next_batch(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT replay_key, product_id, customer_id, sale_date, amount FROM pending_sales "
+                "WHERE status='pending' ORDER BY queued_at LIMIT ?",
+                (JOURNAL_BATCH_SIZE,),
+            ).fetchall()
+
+    def _insert(self, batch):
+        """Insert a batch in one MySQL transaction; return {replay_key: sale_id}."""
+        with get_cursor(commit=True) as cursor:
+            # Only a repeated replay_key is ignored; bad values still raise in
+            # strict mode (INSERT IGNORE would store them zeroed or clamped).
+            cursor.executemany(
+                "INSERT INTO sales (replay_key, product_id, customer_id, sale_date, amount) "
+                "VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE id = id",
+                batch,
+            )
+            placeholders = ",".join(["%s"] * len(batch))
+            cursor.execute(f"SELECT id, replay_key FROM sales WHERE replay_key IN ({placeholders})",
+                           [row[0] for row in batch])
+            return {r["replay_key"]: r["id"] for r in cursor.fetchall()}
+
+    def _mark_done(self, ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM pending_sales WHERE replay_key=?", [(k,) for k in ids])
+        for key, sale_id in ids.items():
+            self.flushed.put((key, sale_id))
+
+    def _mark_rejected(self, key, err):
+        with self._lock:
+            self._db.execute(
+                "UPDATE pending_sales SET status='rejected', attempts=attempts+1, last_error=? "
+                "WHERE replay_key=?", (str(err), key))
+        self.rejected.put((key, str(err)))
+        print(f"[journal] Rejected sale {key}: {err}")
+
+    def flush(self):
+        """Drain pending sales; returns number flushed. Raises on connectivity errors."""
+        with self._flush_lock:
+            total = 0
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return total
+                rejected = set()
+                try:
+                    done = self._insert(batch)
+                except mysql.connector.Error as err:
+                    if not _is_row_error(err):
+                        raise
+                    # One bad row (e.g. deleted product) must not block the rest:
+                    # replay this batch row by row to isolate it.
+                    done = {}
+                    for row in batch:
+                        try:
+                            done.update(self._insert([row]))
+                        except mysql.connector.Error as row_err:
+                            if not _is_row_error(row_err):
+                                raise
+                            self._mark_rejected(row[0], row_err)
+                            rejected.add(row[0])
+                # Should not happen with a plain INSERT, but never retry a row forever
+                for row in batch:
+                    if row[0] not in done and row[0] not in rejected:
+                        self._mark_rejected(row[0], "not found in database after insert")
+                self._mark_done(done)
+                total += len(done)
+
+    def _run(self):
+        backoff = JOURNAL_FLUSH_MS / 1000
+        while not self._stop.is_set():
+            try:
+                flushed = self.flush()
+                if flushed:
+                    print(f"[journal] Flushed {flushed} sales to database")
+                backoff = JOURNAL_FLUSH_MS / 1000
+            except Exception as e:
+                # MySQL down: keep everything queued and retry with backoff
+                print(f"[journal] Flush failed, will retry: {e}")
+                backoff = min(backoff * 2, 30)
+            self._wake.wait(backoff)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sales-journal", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the flusher and make one last attempt to drain the journal."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still inside a flush (e.g. a slow MySQL); it keeps its rows queued
+                print(f"[journal] Flusher still busy; {self.pending_count()} sales stay queued")
+                return
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[journal] {self.pending_count()} sales left queued: {e}")
+
+
+_journal = None
+
+
+def get_journal():
+    """Process-wide journal, started on first use."""
+    global _journal
+    if _journal is None:
+        _journal = SalesJournal()
+        _journal.start()
+    return _journal
+
+
+if __name__ == "__main__":
+    import sys
+    journal = SalesJournal()
+    if "--requeue" in sys.argv:
+        print(f"[journal] Requeued {journal.requeue_rejected()} rejected sales")
+    journal.stop()
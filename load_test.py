@@ -0,0 +1,86 @@
+"""
+Load test for api_server.py.
+
+    python load_test.py --concurrency 50 --requests 5000 /products /dashboard
+
+Opens `concurrency` keep-alive connections, spreads `requests` GETs over the
+given paths and prints requests/sec plus p50/p95/p99 latency. Pass --etag to
+replay If-None-Match the way a polling dashboard would.
+"""
+import argparse
+import asyncio
+import time
+from config import API
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length:
+        await reader.readexactly(length)
+    return status, headers
+
+
+async def _worker(host, port, paths, count, use_etag, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        for i in range(count):
+            path = paths[i % len(paths)]
+            extra = f"If-None-Match: {etags[path]}\r\n" if use_etag and path in etags else ""
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n"
+            start = time.perf_counter()
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+            status, headers = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if "etag" in headers:
+                etags[path] = headers["etag"]
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(host, port, paths, concurrency, total, use_etag):
+    latencies, statuses = [], {}
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker(host, port, paths, n, use_etag, latencies, statuses)
+                           for n in per_worker if n))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"[load_test] {len(latencies)} requests in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f} req/s, concurrency {concurrency})")
+    print(f"[load_test] latency p50 {_percentile(latencies, 50) * 1000:.2f} ms | "
+          f"p95 {_percentile(latencies, 95) * 1000:.2f} ms | "
+          f"p99 {_percentile(latencies, 99) * 1000:.2f} ms | "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    print(f"[load_test] status codes: {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the PSMMS local API")
+    parser.add_argument("paths", nargs="*", default=["/products", "/customers", "/sales", "/dashboard"])
+    parser.add_argument("--host", default=API["host"])
+    parser.add_argument("--port", type=int, default=API["port"])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--etag", action="store_true", help="send If-None-Match with the last ETag seen")
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.paths, args.concurrency, args.requests, args.etag))
@@ -0,0 +1,150 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from database import execute_query
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace for matching."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+# Text made only of digits and phone punctuation, e.g. "+1 (555) 12-34"
+_PHONE_LIKE = re.compile(r"^[\d\s()+.\-]*\d[\d\s()+.\-]*$")
+
+
+def _name_keys(name):
+    """The full name plus every word, so 'john' matches 'Alice Johnson'."""
+    full = normalize(name)
+    if not full:
+        return []
+    return [full] + full.split(" ")[1:]
+
+
+def _product_entry(r):
+    label = f"{r['name']} ({r.get('category') or '-'}) #{r['id']}"
+    return label, _name_keys(r["name"]) + _name_keys(r.get("category"))
+
+
+def _customer_entry(r):
+    label = f"{r['name']} <{r.get('email') or ''}> #{r['id']}"
+    keys = _name_keys(r["name"])
+    if r.get("email"):
+        keys.append(normalize(r["email"]))
+    digits = re.sub(r"\D", "", r.get("phone") or "")
+    if digits:
+        keys.append(digits)
+    return label, keys
+
+
+# kind -> (query used for the initial load, row -> (label, keys))
+SOURCES = {
+    "products": ("SELECT id, name, category FROM products", _product_entry),
+    "customers": ("SELECT id, name, email, phone FROM customers", _customer_entry),
+}
+
+
+class LookupIndex:
+    """
+    Sorted array of (key, id) pairs searched by prefix with bisect.
+    Lookups are O(log n + k); upsert/remove keep the array sorted so the
+    index can follow individual writes instead of being rebuilt.
+    """
+
+    def __init__(self, entry_fn):
+        self.entry_fn = entry_fn
+        self._pairs = []    # sorted [(key, id)]
+        self._keys = {}     # id -> [key, ...]
+        self.labels = {}    # id -> display label
+
+    def load(self, rows):
+        self._pairs, self._keys, self.labels = [], {}, {}
+        for r in rows:
+            label, keys = self.entry_fn(r)
+            keys = sorted(set(k for k in keys if k))
+            self.labels[r["id"]] = label
+            self._keys[r["id"]] = keys
+            self._pairs.extend((k, r["id"]) for k in keys)
+        self._pairs.sort()
+
+    def upsert(self, row):
+        self.remove(row["id"])
+        label, keys = self.entry_fn(row)
+        keys = sorted(set(k for k in keys if k))
+        self.labels[row["id"]] = label
+        self._keys[row["id"]] = keys
+        for k in keys:
+            insort(self._pairs, (k, row["id"]))
+
+    def remove(self, row_id):
+        for k in self._keys.pop(row_id, []):
+            i = bisect_left(self._pairs, (k, row_id))
+            if i < len(self._pairs) and self._pairs[i] == (k, row_id):
+                del self._pairs[i]
+        self.labels.pop(row_id, None)
+
+    def search(self, text, limit=20):
+        """
+        Return up to `limit` (id, label) pairs whose keys start with `text`.
+        Phone-like text is also matched digits-only, as phone keys are stored.
+        """
+        prefixes = [normalize(text)]
+        if _PHONE_LIKE.match(str(text or "").strip()):
+            prefixes.append(re.sub(r"\D", "", str(text)))
+        found, seen = [], set()
+        for prefix in dict.fromkeys(p for p in prefixes if p):
+            i = bisect_left(self._pairs, (prefix,))
+            while i < len(self._pairs) and len(found) < limit:
+                key, row_id = self._pairs[i]
+                if not key.startswith(prefix):
+                    break
+                if row_id not in seen:
+                    seen.add(row_id)
+                    found.append((row_id, self.labels[row_id]))
+                i += 1
+        return found
+
+
+_indexes = {}
+
+
+def get_index(kind):
+    """Return the process-wide index for 'products' or 'customers', loading it once."""
+    if kind not in _indexes:
+        query, entry_fn = SOURCES[kind]
+        index = LookupIndex(entry_fn)
+        index.load(execute_query(query))
+        _indexes[kind] = index
+    return _indexes[kind]
+
+
+def sync_row(kind, row):
+    """Reflect an inserted/updated row in an already-loaded index."""
+    if kind in _indexes:
+        _indexes[kind].upsert(row)
+
+
+def sync_delete(kind, row_id):
+    if kind in _indexes:
+        _indexes[kind].remove(row_id)
+
+
+def sync_ids(kind, ids):
+    """Re-fetch changed ids (e.g. from another terminal) into a loaded index."""
+    if kind not in _indexes or not ids:
+        return
+    ids = list(ids)
+    query, _ = SOURCES[kind]
+    placeholders = ",".join(["%s"] * len(ids))
+    rows = execute_query(f"{query} WHERE id IN ({placeholders})", ids)
+    for r in rows:
+        _indexes[kind].upsert(r)
+    for row_id in set(ids) - {r["id"] for r in rows}:
+        _indexes[kind].remove(row_id)
+
+
+def reset():
+    """Forget all loaded indexes; they reload lazily on next use."""
+    _indexes.clear()
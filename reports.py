@@ -1,15 +1,13 @@
 import matplotlib.pyplot as plt
-import pandas as pd
-from export_data import fetch_sales_dataframe
+from snapshot import get_snapshot
 from datetime import datetime
 
 
 def revenue_time_series():
-    df = fetch_sales_dataframe()
-    if df.empty:
+    daily = get_snapshot().daily_totals()
+    if daily.empty:
         return
-    df["sale_date"] = pd.to_datetime(df["sale_date"])
-    daily = df.groupby("sale_date")["amount"].sum().reset_index()
+    daily = daily.rename_axis("sale_date").reset_index()
     plt.figure()
     plt.plot(daily["sale_date"], daily["amount"])
     plt.title("Revenue over time")
@@ -21,10 +19,10 @@ def revenue_time_series():
 
 
 def top_products_bar():
-    df = fetch_sales_dataframe()
+    df = get_snapshot().frame(with_products=True)
     if df.empty:
         return
-    top = df.groupby("product")["amount"].sum().sort_values(ascending=False).head(10)
+    top = df.groupby("name")["amount"].sum().sort_values(ascending=False).head(10)
     plt.figure()
     top.plot(kind="bar")
     plt.title("Top Products by Revenue")
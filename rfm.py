@@ -0,0 +1,118 @@
+from database import get_cursor, execute_query
+
+SEGMENTS = ["Champions", "Loyal", "New", "At Risk", "Lapsed", "Needs Attention"]
+
+# Quintile scores (5 = best) and segments are recomputed over customer_metrics
+# only, which has one row per customer, never over the sales table.
+_SCORE_SQL = """
+    UPDATE customer_metrics m
+    JOIN (
+        SELECT customer_id,
+               NTILE(5) OVER (ORDER BY last_sale) AS r,
+               NTILE(5) OVER (ORDER BY frequency) AS f,
+               NTILE(5) OVER (ORDER BY monetary) AS mo
+        FROM customer_metrics
+    ) x ON x.customer_id = m.customer_id
+    SET m.r_score = x.r, m.f_score = x.f, m.m_score = x.mo,
+        m.segment = CASE
+            WHEN x.r >= 4 AND x.f >= 4 THEN 'Champions'
+            WHEN x.r >= 3 AND x.f >= 3 THEN 'Loyal'
+            WHEN x.r >= 4 THEN 'New'
+            WHEN x.r <= 2 AND x.f >= 3 THEN 'At Risk'
+            WHEN x.r <= 2 THEN 'Lapsed'
+            ELSE 'Needs Attention'
+        END
+"""
+
+# Per-customer aggregates over the full history (hot + archive). Recomputing a
+# customer is idempotent, so re-reading part of change_log never double counts.
+# Archived sales of deleted customers are kept but have no metrics row.
+_FOLD_SQL = """
+    INSERT INTO customer_metrics (customer_id, first_sale, last_sale, frequency, monetary)
+    SELECT s.customer_id, MIN(s.sale_date), MAX(s.sale_date), COUNT(*), SUM(s.amount)
+    FROM (
+        SELECT customer_id, sale_date, amount FROM sales {where}
+        UNION ALL
+        SELECT customer_id, sale_date, amount FROM sales_archive {where}
+    ) s
+    JOIN customers c ON c.id = s.customer_id
+    GROUP BY s.customer_id
+"""
+
+# change_log seqs are handed out before commit, so a slow transaction (e.g. a
+# journal batch) can appear below the watermark; this many seqs are re-read.
+OVERLAP = 1000
+
+
+def _recompute(cursor, customers=None):
+    """Rebuild metrics for the given customer ids (None = everyone)."""
+    if customers is None:
+        cursor.execute("DELETE FROM customer_metrics")
+        cursor.execute(_FOLD_SQL.format(where=""))
+        return cursor.rowcount
+    ids = sorted(customers)
+    placeholders = ",".join(["%s"] * len(ids))
+    where = f"WHERE customer_id IN ({placeholders})"
+    cursor.execute(f"DELETE FROM customer_metrics {where}", ids)
+    cursor.execute(_FOLD_SQL.format(where=where), ids + ids)
+    return len(ids)
+
+
+def refresh_metrics(rebuild=False):
+    """
+    Bring customer_metrics up to date using the change_log seq as watermark:
+    customers with sales inserted, edited or deleted since the watermark
+    (re-reading the last OVERLAP seqs, so late commits are caught on the
+    next refresh that sees new changes) are recomputed, then every customer
+    is rescored. A purged change_log, edits logged before change_log
+    recorded the customer, or rebuild=True recompute everyone. Returns the
+    number of customers touched.
+    """
+    with get_cursor(commit=True) as cursor:
+        cursor.execute("SELECT value FROM metrics_state WHERE name = 'rfm_seq' FOR UPDATE")
+        row = cursor.fetchone()
+        watermark = None if row is None else int(row["value"])
+
+        cursor.execute("SELECT MIN(seq) AS oldest, COALESCE(MAX(seq), 0) AS latest FROM change_log")
+        bounds = cursor.fetchone()
+        latest = int(bounds["latest"])
+        if watermark is not None and latest <= watermark and not rebuild:
+            return 0
+        if watermark is None or (bounds["oldest"] is not None and bounds["oldest"] > watermark + 1):
+            rebuild = True
+
+        customers = set()
+        if not rebuild:
+            cursor.execute(
+                "SELECT l.seq, l.op, l.customer_id AS logged, s.customer_id "
+                "FROM change_log l LEFT JOIN sales s ON s.id = l.row_id "
+                "WHERE l.table_name = 'sales' AND l.seq > %s AND l.seq <= %s",
+                (max(watermark - OVERLAP, 0), latest))
+            for r in cursor.fetchall():
+                if r["logged"] is not None:
+                    customers.add(r["logged"])
+                elif r["op"] == "I":
+                    if r["customer_id"] is not None:
+                        customers.add(r["customer_id"])
+                elif r["seq"] > watermark:
+                    rebuild = True  # edit/delete from before the customer_id column
+                    break
+
+        touched = _recompute(cursor, None if rebuild else customers) if rebuild or customers else 0
+        cursor.execute(
+            "INSERT INTO metrics_state (name, value) VALUES ('rfm_seq', %s) "
+            "ON DUPLICATE KEY UPDATE value = VALUES(value)", (latest,))
+        cursor.execute(_SCORE_SQL)
+
+    print(f"[rfm] Customer metrics {'rebuilt' if rebuild else 'updated'} up to change seq {latest}")
+    return touched
+
+
+def segment_counts():
+    rows = execute_query("SELECT segment, COUNT(*) AS n FROM customer_metrics GROUP BY segment")
+    return {r["segment"]: r["n"] for r in rows}
+
+
+if __name__ == "__main__":
+    import sys
+    refresh_metrics(rebuild="--rebuild" in sys.argv)
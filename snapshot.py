@@ -0,0 +1,332 @@
+import json
+import os
+import struct
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from database import execute_query, fetch_columns
+from config import SNAPSHOT
+
+# File layout: a 64-byte header followed by one fixed-width array per column,
+# each sized for `capacity` rows so appends never move existing data.
+MAGIC = b"PSMMSNAP"
+VERSION = 2
+HEADER = struct.Struct("<8sIIqqqq")  # magic, version, reserved, rows, capacity, high-water id, change seq
+HEADER_SIZE = 64
+COLUMNS = [
+    ("id", "<i8"),
+    ("product_id", "<i4"),
+    ("customer_id", "<i4"),
+    ("day", "<i8"),            # days since 1970-01-01, viewable as datetime64[D] without copying
+    ("amount_cents", "<i8"),
+    ("deleted", "u1"),         # tombstone: 1 = deleted in MySQL, dropped on the next rebuild
+]
+EPOCH = date(1970, 1, 1)
+# change_log seqs are handed out before commit, so a slow transaction can
+# commit ids below the high-water mark, or edit a sale, after the snapshot
+# moved past its seq; this many seqs are re-read on every refresh.
+OVERLAP = 1000
+# Ids per "id IN (...)" query when re-reading changed sales
+FETCH_IDS_CHUNK = 1000
+
+
+def _offsets(capacity):
+    offsets, pos = {}, HEADER_SIZE
+    for name, dtype in COLUMNS:
+        offsets[name] = pos
+        pos += np.dtype(dtype).itemsize * capacity
+    return offsets
+
+
+class SalesSnapshot:
+    """
+    Memory-mapped columnar copy of the sales history. Opening it costs a
+    header read and a few mmaps; analytics read the arrays directly.
+    refresh() appends sales with id above the stored high-water mark and
+    re-reads the lower ids change_log lists since the snapshot: late
+    commits are merged in, edits are overwritten in place and deletes are
+    tombstoned. A full rebuild only happens when there is no snapshot yet
+    or change_log was purged past it. Rows are kept sorted by id.
+    """
+
+    def __init__(self, path=SNAPSHOT["path"]):
+        self.path = path
+        self.rows = 0
+        self.capacity = 0
+        self.high_water = 0
+        self.change_seq = 0
+        self.columns = {}
+
+    # --- reading ---
+    def open(self):
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, "rb") as f:
+            magic, version, _, rows, capacity, high_water, change_seq = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            print(f"[snapshot] Ignoring incompatible snapshot {self.path}")
+            return self
+        self.rows, self.capacity, self.high_water, self.change_seq = rows, capacity, high_water, change_seq
+        offsets = _offsets(capacity)
+        self.columns = {
+            name: np.memmap(self.path, dtype=dtype, mode="r", offset=offsets[name], shape=(capacity,))[:rows]
+            for name, dtype in COLUMNS
+        } if rows else {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+        return self
+
+    def _close(self):
+        self.columns = {}
+
+    # --- writing ---
+    def _write_header(self, f):
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, self.rows, self.capacity, self.high_water, self.change_seq)
+                .ljust(HEADER_SIZE, b"\0"))
+
+    def _rewrite(self, data, capacity):
+        """Write all rows into a fresh file with room for `capacity` rows."""
+        tmp = self.path + ".tmp"
+        offsets = _offsets(capacity)
+        self.rows, self.capacity = len(data["id"]), capacity
+        with open(tmp, "wb") as f:
+            self._write_header(f)
+            for name, dtype in COLUMNS:
+                f.seek(offsets[name])
+                f.write(np.ascontiguousarray(data[name], dtype=dtype).tobytes())
+            f.truncate(offsets[COLUMNS[-1][0]] + np.dtype(COLUMNS[-1][1]).itemsize * capacity)
+            f.flush()
+            os.fsync(f.fileno())
+        self._close()  # release our maps before replacing the file (required on Windows)
+        os.replace(tmp, self.path)
+
+    def _patch(self, pos, data):
+        """Overwrite the rows at `pos` in place (edits and tombstones); the caller writes the header."""
+        offsets = _offsets(self.capacity)
+        for name, dtype in COLUMNS:
+            view = np.memmap(self.path, dtype=dtype, mode="r+", offset=offsets[name], shape=(self.capacity,))
+            view[pos] = data[name]
+            view.flush()
+            del view
+
+    def _sync_header(self):
+        with open(self.path, "r+b") as f:
+            self._write_header(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append(self, data):
+        new = len(data["id"])
+        if self.rows + new > self.capacity:
+            merged = {name: np.concatenate([self.columns.get(name, np.zeros(0, dtype)), data[name]])
+                      for name, dtype in COLUMNS}
+            self._rewrite(merged, max(SNAPSHOT["min_capacity"], 2 * (self.rows + new)))
+            return
+        offsets = _offsets(self.capacity)
+        for name, dtype in COLUMNS:
+            view = np.memmap(self.path, dtype=dtype, mode="r+", offset=offsets[name], shape=(self.capacity,))
+            view[self.rows:self.rows + new] = data[name]
+            view.flush()
+            del view
+        # Header last: a crash mid-append leaves the old row count, i.e. the old snapshot
+        self.rows += new
+        self._sync_header()
+
+    def _fetch(self, source, condition, params):
+        cols = fetch_columns(
+            f"SELECT id, product_id, customer_id, sale_date, amount FROM {source} WHERE {condition} ORDER BY id",
+            params, kinds={"amount": "cents"}, replica=True,
+        )
+        return {
+            "id": cols["id"],
+            "product_id": cols["product_id"],
+            "customer_id": cols["customer_id"],
+            "day": cols["sale_date"].astype("datetime64[D]").view(np.int64),
+            "amount_cents": cols["amount"],
+            "deleted": np.zeros(len(cols["id"]), dtype=np.uint8),
+        }
+
+    def _fetch_ids(self, ids):
+        """Current rows for the given ids from hot and archived sales (deleted ids are absent)."""
+        parts = []
+        for i in range(0, len(ids), FETCH_IDS_CHUNK):
+            chunk = tuple(int(x) for x in ids[i:i + FETCH_IDS_CHUNK])
+            parts.append(self._fetch("sales_all", f"id IN ({','.join(['%s'] * len(chunk))})", chunk))
+        return {name: np.concatenate([p[name] for p in parts]) for name, _ in COLUMNS}
+
+    def _positions(self, ids):
+        """Row index of each id in the snapshot, -1 where it is not there."""
+        have = self.columns["id"]
+        if not len(have):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(have, ids), len(have) - 1)
+        return np.where(have[pos] == ids, pos, -1)
+
+    def _needs_rebuild(self):
+        """True if there is no snapshot yet or change_log was purged past it."""
+        if not self.rows:
+            return True
+        oldest = execute_query("SELECT MIN(seq) AS oldest FROM change_log", replica=True)[0]["oldest"]
+        return oldest is not None and oldest > self.change_seq + 1
+
+    def _changed_ids(self):
+        """
+        Ids at or below the high-water mark to re-read: sales edited or
+        deleted since the snapshot, and inserts the snapshot does not have
+        (late commits).
+        """
+        rows = execute_query(
+            "SELECT DISTINCT row_id, op FROM change_log "
+            "WHERE table_name = 'sales' AND seq > %s AND row_id <= %s",
+            (max(self.change_seq - OVERLAP, 0), self.high_water), replica=True,
+        )
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.array([r["row_id"] for r in rows], dtype=np.int64)
+        inserted = np.array([r["op"] == "I" for r in rows])
+        return np.unique(ids[~inserted | (self._positions(ids) < 0)])
+
+    def _changes(self, changed):
+        """
+        Split re-read sales into rows to overwrite ({pos, columns}, only
+        those that actually differ) and late rows to merge in.
+        """
+        fetched = self._fetch_ids(changed)
+        pos = self._positions(fetched["id"])
+        late = {name: arr[pos < 0] for name, arr in fetched.items()}
+        # Known ids that are gone from sales_all were deleted: tombstone them
+        gone = np.setdiff1d(changed, fetched["id"])
+        gone_pos = self._positions(gone)
+        gone_pos = gone_pos[gone_pos >= 0]
+        tombstones = {name: np.asarray(self.columns[name][gone_pos]) for name, _ in COLUMNS}
+        tombstones["deleted"] = np.ones(len(gone_pos), dtype=np.uint8)
+
+        upd_pos = np.concatenate([pos[pos >= 0], gone_pos])
+        upd = {name: np.concatenate([fetched[name][pos >= 0], tombstones[name]]) for name, _ in COLUMNS}
+        differs = np.zeros(len(upd_pos), dtype=bool)
+        for name, _ in COLUMNS:
+            differs |= self.columns[name][upd_pos] != upd[name]
+        return upd_pos[differs], {name: arr[differs] for name, arr in upd.items()}, late
+
+    def refresh(self):
+        """Bring the snapshot up to date; returns the number of rows added, changed (or rebuilt)."""
+        seq = int(execute_query("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log", replica=True)[0]["seq"])
+        if self._needs_rebuild():
+            data = self._fetch("sales_all", "id > %s", (0,))
+            self.high_water = int(data["id"].max()) if len(data["id"]) else 0
+            self.change_seq = seq
+            self._rewrite(data, max(SNAPSHOT["min_capacity"], 2 * len(data["id"])))
+            added = len(data["id"])
+        else:
+            changed = self._changed_ids()
+            upd_pos, upd, late = self._changes(changed) if len(changed) else (np.zeros(0, np.int64), {}, None)
+            data = self._fetch("sales", "id > %s", (self.high_water,))
+            if late is not None and len(late["id"]):
+                # Rare (out-of-order commits): merge them in and rewrite in id order
+                merged = {name: np.array(arr) for name, arr in self.columns.items()}
+                for name, _ in COLUMNS:
+                    merged[name][upd_pos] = upd[name]
+                merged = {name: np.concatenate([merged[name], late[name], data[name]]) for name, _ in COLUMNS}
+                order = np.argsort(merged["id"], kind="stable")
+                self.change_seq = seq
+                self.high_water = max(self.high_water, int(merged["id"].max()))
+                self._rewrite({name: arr[order] for name, arr in merged.items()},
+                              max(SNAPSHOT["min_capacity"], 2 * len(order)))
+                added = len(late["id"]) + len(data["id"]) + len(upd_pos)
+            else:
+                if len(upd_pos):
+                    # Crash before the header is rewritten: the old change_seq re-applies these
+                    self._patch(upd_pos, upd)
+                self.change_seq = seq
+                if len(data["id"]):
+                    self.high_water = max(self.high_water, int(data["id"].max()))
+                    self._append(data)
+                elif len(upd_pos):
+                    self._sync_header()
+                added = len(data["id"]) + len(upd_pos)
+        self._save_products()
+        self.open()
+        return added
+
+    # --- product names (small table, kept alongside for offline viewing) ---
+    def _save_products(self):
+        rows = execute_query("SELECT id, name, category FROM products", replica=True)
+        with open(self.path + ".products.json", "w", encoding="utf-8") as f:
+            json.dump([[r["id"], r["name"], r["category"]] for r in rows], f)
+
+    def products(self):
+        path = self.path + ".products.json"
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=["id", "name", "category"])
+        with open(path, "r", encoding="utf-8") as f:
+            return pd.DataFrame(json.load(f), columns=["id", "name", "category"])
+
+    # --- analytics views ---
+    def _columns(self):
+        """Columns without tombstoned rows (they stay in the file until the next rebuild)."""
+        cols = self.columns or {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+        if cols["deleted"].any():
+            live = cols["deleted"] == 0
+            cols = {name: arr[live] for name, arr in cols.items()}
+        return cols
+
+    def frame(self, days=None, with_products=False):
+        """
+        Sales as a DataFrame (sale_date datetime64, amount float64); days=None
+        for all history. with_products=True adds the product name and category.
+        """
+        cols = self._columns()
+        if days:
+            mask = cols["day"] >= (date.today() - timedelta(days=days) - EPOCH).days
+            cols = {name: arr[mask] for name, arr in cols.items()}
+        df = pd.DataFrame({
+            "id": cols["id"],
+            "product_id": cols["product_id"],
+            "customer_id": cols["customer_id"],
+            "sale_date": cols["day"].view("datetime64[D]"),
+            "amount": cols["amount_cents"] / 100.0,
+        })
+        if with_products:
+            df = df.merge(self.products().rename(columns={"id": "product_id"}), on="product_id", how="left")
+        return df
+
+    def daily_totals(self, start=None, end=None):
+        """Per-day revenue for start <= sale_date <= end (None = open), indexed by date; only days with sales."""
+        cols = self._columns()
+        day = cols["day"]
+        if not len(day):
+            return pd.Series(dtype=np.float64)
+        lo = int(day.min()) if start is None else (start - EPOCH).days
+        hi = int(day.max()) if end is None else (end - EPOCH).days
+        mask = (day >= lo) & (day <= hi)
+        offsets = day[mask] - lo
+        if not len(offsets):
+            return pd.Series(dtype=np.float64)
+        counts = np.bincount(offsets, minlength=hi - lo + 1)
+        sums = np.bincount(offsets, weights=cols["amount_cents"][mask], minlength=hi - lo + 1) / 100.0
+        present = np.flatnonzero(counts)
+        return pd.Series(sums[present], index=pd.DatetimeIndex((present + lo).astype("datetime64[D]")),
+                         name="amount")
+
+
+_snapshot = None
+
+
+def get_snapshot(refresh=True):
+    """
+    Process-wide snapshot, opened once. With refresh=True it is topped up
+    from MySQL first; if the database is unreachable the last snapshot is
+    used as-is so charts still work offline.
+    """
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = SalesSnapshot().open()
+    if refresh:
+        try:
+            added = _snapshot.refresh()
+            if added:
+                print(f"[snapshot] Added or changed {added} sales (high-water id {_snapshot.high_water})")
+        except Exception as e:
+            if not _snapshot.rows:
+                raise
+            print(f"[snapshot] Refresh failed, using offline snapshot of {_snapshot.rows} sales: {e}")
+    return _snapshot
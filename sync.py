@@ -0,0 +1,96 @@
+import time
+from database import execute_query
+from config import CHANGE_LOG_RETENTION_DAYS
+
+
+def current_seq():
+    rows = execute_query("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log")
+    return int(rows[0]["seq"])
+
+
+def purge_change_log(days=CHANGE_LOG_RETENTION_DAYS):
+    """Drop change_log rows older than the retention window."""
+    execute_query("DELETE FROM change_log WHERE changed_at < NOW() - INTERVAL %s DAY",
+                  (days,), commit=True)
+
+
+class ChangeFeed:
+    """
+    Client-side cursor over change_log. Each poll() is one indexed range
+    read on seq and returns only what changed since the last call.
+
+    AUTO_INCREMENT seqs are handed out before commit, so a slow transaction
+    can become visible after a higher seq was already read. Every seq
+    skipped over is remembered as a gap and re-read on each poll until it
+    shows up or is older than `gap_timeout` seconds (rolled-back inserts
+    leave permanent gaps).
+    """
+
+    def __init__(self, batch_size=1000, gap_timeout=120, startup_window=5000):
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        self.last_seq = current_seq()
+        self._gaps = {}  # seq -> time.monotonic() when first found missing
+        # Seqs below the startup position that are not visible yet may belong
+        # to transactions still in flight, so they start out as gaps.
+        low = max(self.last_seq - startup_window, 0)
+        rows = execute_query("SELECT seq FROM change_log WHERE seq > %s AND seq <= %s",
+                             (low, self.last_seq))
+        oldest = min((r["seq"] for r in rows), default=self.last_seq + 1)
+        self._note_gaps(range(max(low + 1, oldest), self.last_seq + 1), {r["seq"] for r in rows})
+
+    def _note_gaps(self, seqs, present):
+        now = time.monotonic()
+        for seq in seqs:
+            if seq not in present:
+                self._gaps.setdefault(seq, now)
+
+    def _late_rows(self):
+        """Rows for gap seqs that have committed since; expired gaps are dropped."""
+        if not self._gaps:
+            return []
+        seqs = list(self._gaps)
+        placeholders = ",".join(["%s"] * len(seqs))
+        rows = execute_query(f"SELECT seq, table_name, row_id FROM change_log WHERE seq IN ({placeholders})",
+                             seqs)
+        for r in rows:
+            self._gaps.pop(r["seq"], None)
+        expired = time.monotonic() - self.gap_timeout
+        self._gaps = {seq: t for seq, t in self._gaps.items() if t > expired}
+        return rows
+
+    def poll(self):
+        """
+        Return {table: set(row_ids)} changed since the previous poll, or
+        None if change_log was purged past our position (caller should do a
+        full reload).
+        """
+        late = self._late_rows()
+        rows = execute_query(
+            "SELECT seq, table_name, row_id FROM change_log "
+            "WHERE seq > %s ORDER BY seq LIMIT %s",
+            (self.last_seq, self.batch_size),
+        )
+        if not rows and not late:
+            return {}
+
+        lost = bool(rows) and rows[0]["seq"] > self.last_seq + 1 and self._purged_past()
+        if rows:
+            self._note_gaps(range(self.last_seq + 1, rows[-1]["seq"]), {r["seq"] for r in rows})
+            self.last_seq = rows[-1]["seq"]
+        if lost:
+            self._gaps.clear()
+            return None
+        rows = late + rows
+
+        changes = {}
+        for r in rows:
+            changes.setdefault(r["table_name"], set()).add(r["row_id"])
+        return changes
+
+    def _purged_past(self):
+        # Seq gaps are normal (rolled-back inserts); history is only lost if
+        # the oldest retained row is newer than our position.
+        rows = execute_query("SELECT MIN(seq) AS seq FROM change_log")
+        oldest = rows[0]["seq"]
+        return self.last_seq > 0 and oldest is not None and oldest > self.last_seq + 1
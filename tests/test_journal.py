@@ -0,0 +1,143 @@
+"""SalesJournal flush/replay/reject/requeue against a stubbed MySQL cursor."""
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+
+mysql_connector = pytest.importorskip("mysql.connector")
+journal = pytest.importorskip("journal")
+
+
+class FakeSales:
+    """Just enough of the sales table: UNIQUE replay_key, FK on product_id."""
+
+    def __init__(self, products=(1, 2)):
+        self.products = set(products)
+        self.rows = {}          # replay_key -> id
+        self.next_id = 1
+        self.down = None        # exception raised on connect, if set
+        self.inserts = 0
+
+    @contextmanager
+    def get_cursor(self, commit=False):
+        if self.down is not None:
+            raise self.down
+        staged = dict(self.rows)
+        cursor = FakeCursor(self, staged)
+        yield cursor
+        if commit:
+            self.rows = staged
+
+
+class FakeCursor:
+    def __init__(self, db, staged):
+        self.db, self.staged, self._result = db, staged, []
+
+    def executemany(self, query, rows):
+        assert "INSERT IGNORE" not in query
+        for key, product_id, customer_id, sale_date, amount in rows:
+            self.db.inserts += 1
+            if product_id not in self.db.products:
+                raise mysql_connector.errors.IntegrityError(
+                    msg="Cannot add or update a child row", errno=1452)
+            if key not in self.staged:
+                self.staged[key] = self.db.next_id
+                self.db.next_id += 1
+
+    def execute(self, query, keys):
+        self._result = [{"id": self.staged[k], "replay_key": k} for k in keys if k in self.staged]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeSales()
+    monkeypatch.setattr(journal, "get_cursor", fake.get_cursor)
+    return fake
+
+
+@pytest.fixture
+def sales_journal(tmp_path):
+    j = journal.SalesJournal(str(tmp_path / "journal.db"))
+    yield j
+    j._db.close()
+
+
+def drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_flush_inserts_pending_sales(db, sales_journal):
+    keys = [sales_journal.append(1, 1, "2024-01-02", "10.50") for _ in range(3)]
+    assert sales_journal.flush() == 3
+    assert sales_journal.pending_count() == 0
+    assert sorted(k for k, _ in drain(sales_journal.flushed)) == sorted(keys)
+    assert set(db.rows) == set(keys)
+
+
+def test_replayed_key_is_not_duplicated(db, sales_journal):
+    sales_journal.append(1, 1, "2024-01-02", "5", replay_key="pos-1")
+    sales_journal.flush()
+    # The terminal retries the same sale (e.g. after a timeout)
+    sales_journal.append(1, 1, "2024-01-02", "5", replay_key="pos-1")
+    sales_journal.flush()
+    assert list(db.rows) == ["pos-1"]
+
+
+def test_replay_after_commit_without_local_ack(db, sales_journal):
+    key = sales_journal.append(1, 1, "2024-01-02", "5")
+    db.rows[key] = 99   # committed in MySQL, but the journal never heard back
+    assert sales_journal.flush() == 1
+    assert drain(sales_journal.flushed) == [(key, 99)]
+
+
+def test_bad_row_is_rejected_without_blocking_batch(db, sales_journal):
+    good = sales_journal.append(1, 1, "2024-01-02", "1")
+    bad = sales_journal.append(42, 1, "2024-01-02", "1")   # unknown product
+    assert sales_journal.flush() == 1
+    assert set(db.rows) == {good}
+    assert [k for k, _ in drain(sales_journal.rejected)] == [bad]
+    assert sales_journal.rejected_count() == 1
+    assert sales_journal.pending_count() == 0
+
+
+def test_requeue_rejected(db, sales_journal):
+    bad = sales_journal.append(42, 1, "2024-01-02", "1")
+    sales_journal.flush()
+    db.products.add(42)     # product restored
+    assert sales_journal.requeue_rejected() == 1
+    assert sales_journal.flush() == 1
+    assert bad in db.rows
+    assert sales_journal.rejected_count() == 0
+
+
+@pytest.mark.parametrize("error", [
+    lambda: mysql_connector.errors.ProgrammingError(msg="Access denied", errno=1045, sqlstate="28000"),
+    lambda: mysql_connector.errors.InterfaceError(msg="Can't connect", errno=2003),
+])
+def test_connection_errors_keep_rows_pending(db, sales_journal, error):
+    sales_journal.append(1, 1, "2024-01-02", "1")
+    db.down = error()
+    with pytest.raises(mysql_connector.Error):
+        sales_journal.flush()
+    assert sales_journal.pending_count() == 1
+    assert sales_journal.rejected_count() == 0
+    db.down = None
+    assert sales_journal.flush() == 1
+
+
+@pytest.mark.parametrize("amount", ["NaN", "Infinity", "-1", "100000000", "abc"])
+def test_append_rejects_amounts_sales_cannot_hold(sales_journal, amount):
+    with pytest.raises(ValueError):
+        sales_journal.append(1, 1, "2024-01-02", amount)
+    assert sales_journal.pending_count() == 0
+
+
+def test_validate_amount_rounds_to_cents():
+    assert journal.validate_amount("12.345") == Decimal("12.35")
+    assert journal.validate_amount(journal.MAX_AMOUNT) == journal.MAX_AMOUNT
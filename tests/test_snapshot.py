@@ -0,0 +1,163 @@
+"""SalesSnapshot file format and incremental refresh against an in-memory sales/change_log."""
+import re
+from datetime import date
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mysql.connector")
+snapshot = pytest.importorskip("snapshot")
+
+
+class FakeDB:
+    """sales, sales_archive and change_log as dicts/lists; answers the queries snapshot.py sends."""
+
+    def __init__(self):
+        self.sales, self.archive, self.log = {}, {}, []
+
+    def _log(self, row_id, op):
+        self.log.append(((self.log[-1][0] if self.log else 0) + 1, row_id, op))
+
+    def insert(self, row_id, amount, day=date(2024, 1, 1), customer_id=1):
+        self.sales[row_id] = (1, customer_id, day, amount)
+        self._log(row_id, "I")
+
+    def update(self, row_id, amount):
+        product_id, customer_id, day, _ = self.sales[row_id]
+        self.sales[row_id] = (product_id, customer_id, day, amount)
+        self._log(row_id, "U")
+
+    def delete(self, row_id):
+        del self.sales[row_id]
+        self._log(row_id, "D")
+
+    def execute_query(self, query, params=None, replica=False):
+        if "MAX(seq)" in query:
+            return [{"seq": self.log[-1][0] if self.log else 0}]
+        if "MIN(seq)" in query:
+            return [{"oldest": self.log[0][0] if self.log else None}]
+        if "FROM change_log" in query:
+            after, high_water = params
+            return [{"row_id": r, "op": op} for s, r, op in self.log if s > after and r <= high_water]
+        if "FROM products" in query:
+            return [{"id": 1, "name": "Widget", "category": "Tools"}]
+        raise AssertionError(query)
+
+    def fetch_columns(self, query, params=None, kinds=None, replica=False):
+        source = re.search(r"FROM (\w+)", query).group(1)
+        rows = dict(self.sales)
+        if source == "sales_all":
+            rows.update(self.archive)
+        if "id IN" in query:
+            ids = set(params)
+        else:
+            ids = {i for i in rows if i > params[0]}
+        picked = sorted(i for i in rows if i in ids)
+        return {
+            "id": np.array(picked, dtype=np.int64),
+            "product_id": np.array([rows[i][0] for i in picked], dtype=np.int32),
+            "customer_id": np.array([rows[i][1] for i in picked], dtype=np.int32),
+            "sale_date": np.array([rows[i][2] for i in picked], dtype="datetime64[D]"),
+            "amount": np.array([rows[i][3] for i in picked], dtype=np.int64),
+        }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(snapshot, "execute_query", fake.execute_query)
+    monkeypatch.setattr(snapshot, "fetch_columns", fake.fetch_columns)
+    monkeypatch.setitem(snapshot.SNAPSHOT, "min_capacity", 8)
+    return fake
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sales.bin")
+
+
+def amounts(snap):
+    df = snap.frame()
+    return dict(zip(df["id"].tolist(), (df["amount"] * 100).round().astype(int).tolist()))
+
+
+def test_header_and_columns_round_trip(db, path):
+    for i in (1, 2, 3):
+        db.insert(i, i * 100)
+    assert snapshot.SalesSnapshot(path).refresh() == 3
+
+    with open(path, "rb") as f:
+        magic, version, _, rows, capacity, high_water, seq = snapshot.HEADER.unpack(f.read(snapshot.HEADER.size))
+    assert (magic, version, rows, capacity, high_water, seq) == (snapshot.MAGIC, snapshot.VERSION, 3, 8, 3, 3)
+
+    snap = snapshot.SalesSnapshot(path).open()
+    assert snap.rows == 3 and snap.high_water == 3 and snap.change_seq == 3
+    assert amounts(snap) == {1: 100, 2: 200, 3: 300}
+    assert snap.daily_totals().tolist() == [6.0]
+
+
+def test_incompatible_file_is_ignored(db, path):
+    db.insert(1, 100)
+    snapshot.SalesSnapshot(path).refresh()
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write((snapshot.VERSION + 1).to_bytes(4, "little"))
+    assert snapshot.SalesSnapshot(path).open().rows == 0
+
+
+def test_append_grows_capacity(db, path):
+    snap = snapshot.SalesSnapshot(path)
+    db.insert(1, 100)
+    snap.refresh()
+    for i in range(2, 12):
+        db.insert(i, 100)
+    assert snap.refresh() == 10
+    assert snap.rows == 11 and snap.capacity >= 11
+    assert list(snapshot.SalesSnapshot(path).open().frame()["id"]) == list(range(1, 12))
+
+
+def test_updates_and_deletes_are_applied_by_id(db, path):
+    snap = snapshot.SalesSnapshot(path)
+    for i in (1, 2, 3):
+        db.insert(i, 100)
+    snap.refresh()
+
+    db.update(2, 250)
+    db.delete(3)
+    db.insert(4, 400)
+    assert snap.refresh() == 3            # one edit, one tombstone, one new sale
+    assert snap.rows == 4                 # deleted sale stays in the file as a tombstone
+    assert amounts(snap) == {1: 100, 2: 250, 4: 400}
+    assert snap.daily_totals().tolist() == [7.5]
+    assert amounts(snapshot.SalesSnapshot(path).open()) == {1: 100, 2: 250, 4: 400}
+
+    # Re-reading the same change_log window again changes nothing
+    assert snap.refresh() == 0
+
+
+def test_late_commit_below_high_water_is_merged(db, path):
+    snap = snapshot.SalesSnapshot(path)
+    db.insert(1, 100)
+    db.insert(3, 300)
+    snap.refresh()
+    db.insert(2, 200)                     # id 2 committed after id 3
+    db.update(1, 150)
+    assert snap.refresh() == 2
+    assert list(snap.frame()["id"]) == [1, 2, 3]
+    assert amounts(snap) == {1: 150, 2: 200, 3: 300}
+
+
+def test_purged_change_log_rebuilds(db, path):
+    snap = snapshot.SalesSnapshot(path)
+    for i in (1, 2):
+        db.insert(i, 100)
+    snap.refresh()
+    db.delete(2)
+    snap.refresh()
+    assert snap.rows == 2
+
+    db.insert(3, 300)
+    db.log = [(snap.change_seq + 2, 3, "I")]   # purged past the snapshot's seq
+    snap.refresh()
+    assert snap.rows == 2                 # rebuilt: tombstone dropped, id 3 added
+    assert amounts(snap) == {1: 100, 3: 300}
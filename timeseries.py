@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Bucket sizes tried in order; the first one that fits the pixel budget wins.
+RESOLUTIONS = [("D", "Daily", 1), ("W", "Weekly", 7), ("MS", "Monthly", 30)]
+
+
+def choose_resolution(start, end, max_points):
+    """Pick the finest day/week/month bucket giving at most max_points buckets."""
+    span_days = max((pd.Timestamp(end) - pd.Timestamp(start)).days + 1, 1)
+    for freq, label, days in RESOLUTIONS:
+        if span_days / days <= max_points:
+            return freq, label
+    return RESOLUTIONS[-1][0], RESOLUTIONS[-1][1]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps first/last points and,
+    per bucket, the point forming the largest triangle with the previously
+    kept point and the next bucket's average, so peaks and dips survive.
+    x must be numeric (e.g. date ordinals) and sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo = edges[i + 1]
+        nhi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:max(nhi, nlo + 1)].mean(), y[nlo:max(nhi, nlo + 1)].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(series, max_points):
+    """
+    Bucket a date-indexed series (sum per day/week/month) and, if it is still
+    longer than max_points, thin it with LTTB. Returns (series, label).
+    """
+    series = series.sort_index()
+    if series.empty:
+        return series, "Daily"
+    freq, label = choose_resolution(series.index.min(), series.index.max(), max_points)
+    # resample (not asfreq) so timestamps within a day are summed into it, not dropped
+    bucketed = series.resample(freq).sum()
+    if len(bucketed) > max_points:
+        keep = lttb(bucketed.index.map(pd.Timestamp.toordinal).to_numpy(), bucketed.to_numpy(), max_points)
+        bucketed = bucketed.iloc[keep]
+    return bucketed, label
+
+
+def max_points_for(fig, ax=None):
+    """Pixel width of the axes (or figure): one plotted point per pixel column at most."""
+    if ax is not None:
+        return max(int(ax.get_window_extent().width), 10)
+    return max(int(fig.get_figwidth() * fig.dpi), 10)